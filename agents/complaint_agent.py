@@ -1,15 +1,20 @@
 # agents/complaint_agent.py
 import json
-from langchain.agents import OpenAIFunctionsAgent, AgentExecutor
+from langchain.agents import OpenAIFunctionsAgent
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     MessagesPlaceholder
 )
 from langchain.schema import SystemMessage
-from langchain.chat_models import ChatOpenAI
 from tools.complaint_tools import complaint_tools
 from langchain.schema import AIMessage, HumanMessage
+from utils.llm_gateway import get_chat_model
+from utils.session_store import get_current_session_id
+from utils.history import history_manager
+from utils.metrics import agent_callbacks
+from utils.deadline import DeadlineAgentExecutor
+from utils.tracing import span
 
 
 class ComplaintAgentWrapper:
@@ -64,22 +69,29 @@ Contoh percakapan:
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
 
-        llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+        llm = get_chat_model("gpt-4.1", temperature=0, stream_to_user=True)
         agent = OpenAIFunctionsAgent(llm=llm, prompt=prompt, tools=complaint_tools)
-        self.executor = AgentExecutor(agent=agent, tools=complaint_tools, verbose=True)
-        self.chat_history = []
+        self.executor = DeadlineAgentExecutor(agent=agent, tools=complaint_tools, verbose=True)
+        self.history_namespace = "complaint"
 
-    def ask(self, user_input: str) -> str:
+    def ask(self, user_input: str, record_history: bool = True) -> str:
+        session_id = get_current_session_id()
         try:
             result = self.executor.invoke({
                 "input": user_input,
-                "chat_history": self.chat_history
-            })
-            self.chat_history.append(HumanMessage(content=user_input))
-            self.chat_history.append(AIMessage(content=result["output"]))
+                "chat_history": history_manager.get_history(session_id, self.history_namespace)
+            }, config={"callbacks": agent_callbacks()})
+            if record_history:
+                history_manager.append(
+                    session_id,
+                    self.history_namespace,
+                    HumanMessage(content=user_input),
+                    AIMessage(content=result["output"])
+                )
             return result["output"]
         except Exception as e:
             return f"Maaf, terjadi kesalahan: {e}"
 
-    def run(self, user_input: str) -> str:
-        return self.ask(user_input)
\ No newline at end of file
+    def run(self, user_input: str, record_history: bool = True) -> str:
+        with span(f"agent.{self.history_namespace}"):
+            return self.ask(user_input, record_history)
\ No newline at end of file
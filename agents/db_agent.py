@@ -1,19 +1,26 @@
 # agents/db_agent.py
-from langchain.agents import OpenAIFunctionsAgent, AgentExecutor
+from langchain.agents import OpenAIFunctionsAgent
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
-    MessagesPlaceholder
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate
 )
 from langchain.schema import SystemMessage
-from langchain.chat_models import ChatOpenAI
 from tools.db_tools import db_tools
+from database.schema_catalog import schema_catalog
 from langchain.schema import AIMessage, HumanMessage
+from utils.llm_gateway import get_chat_model
+from utils.session_store import get_current_session_id
+from utils.history import history_manager
+from utils.metrics import agent_callbacks
+from utils.deadline import DeadlineAgentExecutor
+from utils.tracing import span
 
 
 class DBAgentWrapper:
     def __init__(self):
-        prompt = ChatPromptTemplate.from_messages([
+        messages = [
             SystemMessage(content="""Kamu adalah agen spesialis SQL untuk sistem manajemen guest house.
                           
 Gunakan tools untuk mendapatkan data.
@@ -100,28 +107,44 @@ Peraturan penting yang harus selalu kamu patuhi:
 - Balikan Dokumen Tata Tertib Detail Kamar: ``` https://drive.google.com/file/d/1VwC6hu0h_Jymknvwl1asRmsx_0tE6QqO/view?usp=sharing ```
 
 """),
+        ]
+        if schema_catalog.in_prompt:
+            # Rendered from the schema catalog on every call, so DDL shows up without a restart
+            messages.append(SystemMessagePromptTemplate.from_template(
+                "Skema lengkap database saat ini (tidak perlu memanggil list_tables/describe_tables):\n{db_schema}"))
+        prompt = ChatPromptTemplate.from_messages(messages + [
             MessagesPlaceholder(variable_name="chat_history"),
             HumanMessagePromptTemplate.from_template("{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
 
-        llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+        llm = get_chat_model("gpt-4.1", temperature=0, stream_to_user=True)
         agent = OpenAIFunctionsAgent(llm=llm, prompt=prompt, tools=db_tools)
-        self.executor = AgentExecutor(
+        self.executor = DeadlineAgentExecutor(
             agent=agent, tools=db_tools, verbose=True)
-        self.chat_history = []
+        self.history_namespace = "db"
 
-    def ask(self, user_input: str) -> str:
+    def ask(self, user_input: str, record_history: bool = True) -> str:
+        session_id = get_current_session_id()
         try:
-            result = self.executor.invoke({
+            agent_input = {
                 "input": user_input,
-                "chat_history": self.chat_history
-            })
-            self.chat_history.append(HumanMessage(content=user_input))
-            self.chat_history.append(AIMessage(content=result["output"]))
+                "chat_history": history_manager.get_history(session_id, self.history_namespace)
+            }
+            if schema_catalog.in_prompt:
+                agent_input["db_schema"] = schema_catalog.prompt_text()
+            result = self.executor.invoke(agent_input, config={"callbacks": agent_callbacks()})
+            if record_history:
+                history_manager.append(
+                    session_id,
+                    self.history_namespace,
+                    HumanMessage(content=user_input),
+                    AIMessage(content=result["output"])
+                )
             return result["output"]
         except Exception as e:
             return f"Sorry, something went wrong: {e}"
 
-    def run(self, user_input: str) -> str:
-        return self.ask(user_input)
+    def run(self, user_input: str, record_history: bool = True) -> str:
+        with span(f"agent.{self.history_namespace}"):
+            return self.ask(user_input, record_history)
@@ -1,103 +1,410 @@
-from langchain.agents import Tool, initialize_agent, AgentType
-from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
+from langchain.agents import Tool, ConversationalChatAgent
+from langchain.schema import AIMessage, HumanMessage
 from agents.db_agent import DBAgentWrapper
 from agents.qa_agent import QAAgentWrapper
 from agents.complaint_agent import ComplaintAgentWrapper
 from agents.transaction_agent import TransactionAgentWrapper
+from agents.router import IntentRouter, DATABASE_AGENT, DOCUMENT_AGENT, COMPLAINT_AGENT, TRANSACTION_AGENT
+from agents.planner import QueryPlanner
+from agents.small_talk import SmallTalkMatcher
+from agents.speculation import Speculator, SpeculativeWriteBlocked, current_speculation
 from utils.zeroshot_formatter import ZeroShotTextFormatter
+from utils.agent_pool import AgentWorkerPool
+from utils.llm_gateway import get_chat_model, llm_gateway
+from utils.llm_replay import llm_replay
+from utils.session_store import session_store, current_session_id, get_current_session_id
+from utils.streaming import current_stream
+from utils.history import history_manager
+from utils.answer_cache import answer_cache, DOCUMENTS, ROOMS
+from utils.startup import Lazy, startup_report, warm_up
+from utils.metrics import stage, stage_metrics, CHAT_INSERT, ROUTING, LLM_ROUTER, SUB_AGENT, FORMATTER
+from utils.tracing import span, tracer, tracing_callback
+from utils.deadline import (
+    DeadlineAgentExecutor, DeadlineExceeded, TIMEOUT_ANSWER, check, deadline_stats, record_hit, remaining
+)
 from utils.logger import logger
 from datetime import datetime
+import asyncio
+import functools
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import pytz
-from database.db_operator.chat import ChatRepository
+from database.chat_writer import chat_writer
+from database.connection import pool_stats, query_metrics
+from database.sync_pool import sync_pool
+from database.schema_catalog import schema_catalog
+from tools.db_tools import ReadOnlyScope, current_read_only
+from database.db_operator.users import user_id_cache
 
 class MainAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history", return_messages=True)
-
-        # Initialize sub-agents
-        self.db_agent = DBAgentWrapper()
-        self.qa_agent = QAAgentWrapper()
-        self.complaint_agent = ComplaintAgentWrapper()
-        self.transaction_agent = TransactionAgentWrapper()
-        self.formatter = ZeroShotTextFormatter(use_llm=True)
-        self.chat_db = ChatRepository()
+        self.llm = get_chat_model("gpt-4.1-mini", temperature=0, stream_to_user=True)
+        self.sessions = session_store
+        self.history = history_manager
+        self.history_namespace = "main"
+
+        # Sub-agents and the formatter are built on first use (or by warm_up)
+        self._db_agent = Lazy("DatabaseAgent", DBAgentWrapper)
+        self._qa_agent = Lazy("DocumentAgent", QAAgentWrapper)
+        self._complaint_agent = Lazy("ComplaintAgent", ComplaintAgentWrapper)
+        self._transaction_agent = Lazy("TransactionAgent", TransactionAgentWrapper)
+        self._formatter = Lazy("formatter", lambda: ZeroShotTextFormatter(use_llm=True))
+        # Chat log writes are batched in the background, off the reply path
+        self.chat_writer = chat_writer
+        self.router = IntentRouter()
+        self.planner = QueryPlanner(self.router)
+        self.answer_cache = answer_cache
+        self.small_talk = SmallTalkMatcher()
+        self.speculator = Speculator()
+        self._sub_agent_lazies = {
+            DATABASE_AGENT: self._db_agent,
+            DOCUMENT_AGENT: self._qa_agent,
+            COMPLAINT_AGENT: self._complaint_agent,
+            TRANSACTION_AGENT: self._transaction_agent,
+        }
+
+        # Blocking agent chains run here so the event loop stays responsive
+        self.pool = AgentWorkerPool()
 
         # Define tools for the main agent
         self.tools = [
             Tool(
                 name="DatabaseAgent",
-                func=self.db_agent.run,
+                func=lambda q: self._dispatch(DATABASE_AGENT, q),
                 description="Berguna untuk menjawab pertanyaan terkait kost-kostan baik dari ketersediaan kamar, keadaan kost-kostan, pemesanan kamar, hingga update data user dan kosan."
             ),
             Tool(
                 name="DocumentAgent",
-                func=self.qa_agent.run,
+                func=lambda q: self._dispatch(DOCUMENT_AGENT, q),
                 description="Berguna untuk menjawab pertanyaan seputar peraturan kost-kostan, larangan, dan juga hal-hal berbau FAQs"
             ),
             Tool(
                 name="ComplaintAgent",
-                func=self.complaint_agent.run,
+                func=lambda q: self._dispatch(COMPLAINT_AGENT, q),
                 description="Berguna untuk menyelesaikan komplain yang diberikan user terhadap fasilitas, lingkungan, dan service kostan"
             ),
             Tool(
                 name="TransactionAgent",
-                func=self.transaction_agent.run,
+                func=lambda q: self._dispatch(TRANSACTION_AGENT, q),
                 description="Berguna ketika user ingin: bayar sewa, bayar tagihan, bayar deposit, melakukan pembayaran, selalu pastikan user_id dimasukkan ke sini. List harga tagihan dan harga kosan ada di DATABASE AGENT. Butuh informasi hingga room ID yang diperoleh dari DATABASE AGENT."
             )
         ]
 
-        # Initialize main agent
-        self.agent = initialize_agent(
+        self.sub_agents = {tool.name: tool.func for tool in self.tools}
+
+        # Initialize main agent (CHAT_CONVERSATIONAL_REACT_DESCRIPTION); the
+        # deadline-aware executor answers with the last sub-agent result when time runs out
+        self.agent = DeadlineAgentExecutor.from_agent_and_tools(
+            agent=ConversationalChatAgent.from_llm_and_tools(self.llm, self.tools),
             tools=self.tools,
-            llm=self.llm,
-            agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
             verbose=True,
-            memory=self.memory,
             max_iterations=3
         )
 
-    async def run(self, query, user_id):
+    @property
+    def db_agent(self) -> DBAgentWrapper:
+        return self._db_agent.get()
+
+    @property
+    def qa_agent(self) -> QAAgentWrapper:
+        return self._qa_agent.get()
+
+    @property
+    def complaint_agent(self) -> ComplaintAgentWrapper:
+        return self._complaint_agent.get()
+
+    @property
+    def transaction_agent(self) -> TransactionAgentWrapper:
+        return self._transaction_agent.get()
 
+    @property
+    def formatter(self) -> ZeroShotTextFormatter:
+        return self._formatter.get()
+
+    def warm_up(self, parallel: bool = True) -> dict:
+        """Build every lazy component ahead of the first message"""
+        return warm_up([
+            self._db_agent,
+            self._qa_agent,
+            self._complaint_agent,
+            self._transaction_agent,
+            self._formatter,
+        ], parallel=parallel)
+
+    async def run(self, query, user_id, persist_query=True):
+        """
+        Jawab pertanyaan user.
+
+        persist_query=False dipakai jika pesan masuk sudah disimpan sendiri
+        oleh caller (misalnya pesan yang digabung oleh MessageCoalescer).
+        """
+        with span("main_agent.run", user_id=user_id, query_chars=len(query)):
+            return await self._run(query, user_id, persist_query)
+
+    async def record_incoming(self, text, user_id):
+        """Simpan satu pesan masuk user ke tabel messages"""
         try:
-            print(f"Run Main Agent")
             jakarta_tz = pytz.timezone('Asia/Jakarta')
             sent_at = datetime.now(jakarta_tz)
 
-            await self.chat_db.insert_chat(
-                user_id=user_id,
-                chat_type='IN',
-                role='USER',
-                chat=query,
-                sent_at=sent_at
-            )
-            logger.info("User chat inserted successfully.")
+            with stage(CHAT_INSERT):
+                await self.chat_writer.write(
+                    user_id=user_id,
+                    chat_type='IN',
+                    role='USER',
+                    chat=text,
+                    sent_at=sent_at
+                )
+            logger.info("User chat queued for insert.")
         except Exception as e:
             logger.error(f"Error inserting user chat: {e}")
 
-        # Run agent
+    async def _run(self, query, user_id, persist_query):
+        # Sub-agents read their per-user history from this session id
+        current_session_id.set(str(user_id))
+
+        print(f"Run Main Agent")
+        jakarta_tz = pytz.timezone('Asia/Jakarta')
+        if persist_query:
+            await self.record_incoming(query, user_id)
+
+        # Greetings and thanks are answered from templates, other repeats from the cache
+        small_talk = self.small_talk.match(query)
+        if small_talk is not None:
+            intent, formatted_result = small_talk
+            logger.info(f"Small talk answered from template: {intent}")
+        else:
+            formatted_result = self.answer_cache.get(query)
+            if formatted_result is not None:
+                logger.info("Answer served from cache")
+
+        if formatted_result is not None:
+            self.history.append(
+                str(user_id),
+                self.history_namespace,
+                HumanMessage(content=query),
+                AIMessage(content=formatted_result)
+            )
+        else:
+            formatted_result = await self._run_agents(query, user_id)
+
+        try:
+            sent_at = datetime.now(jakarta_tz)
+
+            with stage(CHAT_INSERT):
+                await self.chat_writer.write(
+                    user_id=user_id,
+                    chat_type='OUT',
+                    role='AGENT',
+                    chat=formatted_result,
+                    sent_at=sent_at
+                )
+            logger.info("Agent chat queued for insert.")
+        except Exception as e:
+            logger.error(f"Error inserting agent chat: {e}")
+
+        return formatted_result
+
+    async def _run_agents(self, query, user_id):
+        # Run agent: confident router decisions skip the LLM router round trip
+        agent_input = f"{query}, telegram_id = {user_id}"
+        with stage(ROUTING):
+            decision = self.router.route(query)
+            fast_path = self.router.is_confident(decision)
+            plan = None if fast_path else self.planner.plan(query)
+        started = time.perf_counter()
         try:
-            raw_result = self.agent.run(input=f"{query}, telegram_id = {user_id}")
+            if fast_path:
+                with stage(SUB_AGENT):
+                    raw_result = await self._run_bounded(SUB_AGENT, self.sub_agents[decision.agent], agent_input)
+            elif plan:
+                raw_result = await self._run_plan(query, plan, user_id)
+            else:
+                speculation = self._speculate(decision, agent_input)
+                try:
+                    with stage(LLM_ROUTER):
+                        raw_result = await self._run_bounded(
+                            LLM_ROUTER, self._run_llm_router, agent_input, user_id, speculation)
+                finally:
+                    if speculation is not None:
+                        speculation.discard()
+        except DeadlineExceeded as e:
+            # Nothing usable finished in time; not stored in history or the cache
+            logger.warning(f"No answer before the request deadline ({e.stage})")
+            return TIMEOUT_ANSWER
         except Exception as e:
             logger.error(f"Error running agent: {e}")
             raise
+        if not plan:
+            # Fan-outs are recorded by the planner; router stats compare fast path vs LLM router only
+            self.router.record(fast_path, time.perf_counter() - started)
 
-        formatted_result = self.formatter.format_text(raw_result)
+        self.history.append(
+            str(user_id),
+            self.history_namespace,
+            HumanMessage(content=query),
+            AIMessage(content=raw_result)
+        )
+
+        with stage(FORMATTER):
+            formatted_result = await self.pool.run(self._format, raw_result)
+
+        tags = self._cache_tags(decision.agent, query) if fast_path else None
+        if tags and not self._is_error_answer(raw_result):
+            self.answer_cache.put(query, formatted_result, tags)
+
+        return formatted_result
+
+    async def _run_bounded(self, stage_name, func, *args):
+        """
+        pool.run yang dibatasi sisa waktu request.
 
+        Worker thread tidak bisa dihentikan: setelah deadline, hasilnya
+        dibuang dan slot pool baru kembali ketika thread selesai.
+        """
+        left = remaining()
+        if left is None:
+            return await self.pool.run(func, *args)
+        check(stage_name)
         try:
-            sent_at = datetime.now(jakarta_tz)
+            return await asyncio.wait_for(self.pool.run(func, *args), timeout=left)
+        except asyncio.TimeoutError:
+            record_hit(stage_name)
+            raise DeadlineExceeded(stage_name)
 
-            await self.chat_db.insert_chat(
-                user_id=user_id,
-                chat_type='OUT',
-                role='AGENT',
-                chat=formatted_result,
-                sent_at=sent_at
-            )
-            logger.info("Agent chat inserted successfully.")
+    async def _run_plan(self, query, plan, user_id):
+        """Run independent sub-questions concurrently, then merge them in one LLM step"""
+        started = time.perf_counter()
+        check(SUB_AGENT)
+        tasks = [
+            asyncio.ensure_future(self.pool.run(self._run_branch, agent_name, f"{sub_query}, telegram_id = {user_id}"))
+            for agent_name, sub_query in plan
+        ]
+        # Branches still running at the deadline are dropped; the rest are still answered
+        await asyncio.wait(tasks, timeout=remaining())
+        answers, durations = [], []
+        for (agent_name, _), task in zip(plan, tasks):
+            if not task.done():
+                task.cancel()
+                continue
+            answer, duration = task.result()
+            answers.append((agent_name, answer))
+            durations.append(duration)
+        if len(answers) < len(plan):
+            record_hit(SUB_AGENT)
+        if not answers:
+            raise DeadlineExceeded(SUB_AGENT)
+
+        result = await self.pool.run(self.planner.synthesize, query, answers)
+        self.planner.record(len(plan), time.perf_counter() - started, sum(durations))
+        return result
+
+    def _run_branch(self, agent_name, agent_input):
+        # Parallel branches must not interleave tokens in the user's stream;
+        # only the synthesis step is streamed
+        current_stream.set(None)
+        started = time.perf_counter()
+        with stage(SUB_AGENT):
+            answer = self.sub_agents[agent_name](agent_input)
+        return answer, time.perf_counter() - started
+
+    def _speculate(self, decision, agent_input):
+        """Start the likely sub-agent next to the LLM router, if two workers are free"""
+        if not self.speculator.should_speculate(decision) or not self.pool.has_idle_workers(2):
+            return None
+        speculation = self.speculator.start(decision, agent_input)
+        run = functools.partial(self._run_speculative, decision.agent)
+        speculation.task = asyncio.ensure_future(self.pool.run(speculation.execute, run))
+        return speculation
+
+    def _run_speculative(self, agent_name, agent_input):
+        # Not streamed and not in history until the router actually picks this agent
+        current_stream.set(None)
+        # The router may never pick this run, so it must not change any data
+        read_only = ReadOnlyScope()
+        current_read_only.set(read_only)
+        answer = self._sub_agent_lazies[agent_name].get().run(agent_input, record_history=False)
+        if read_only.blocked_writes:
+            raise SpeculativeWriteBlocked(f"{agent_name} tried to write during a speculative run")
+        return answer
+
+    def _dispatch(self, agent_name, agent_input):
+        """Tool func of a sub-agent; reuses the speculative run if the LLM router agreed"""
+        speculation = current_speculation.get()
+        result = speculation.claim(agent_name, agent_input) if speculation is not None else None
+        if result is None:
+            return self._sub_agent_lazies[agent_name].get().run(agent_input)
+
+        logger.info(f"LLM router agreed with speculative {agent_name}")
+        try:
+            answer = result.result(timeout=remaining())
+        except FutureTimeoutError:
+            record_hit(SUB_AGENT)
+            return TIMEOUT_ANSWER
         except Exception as e:
-            logger.error(f"Error inserting agent chat: {e}")
+            # e.g. SpeculativeWriteBlocked: the agent needs to write, so run it for real
+            logger.info(f"Speculative {agent_name} result unusable ({e}), running it again")
+            return self._sub_agent_lazies[agent_name].get().run(agent_input)
+        self.history.append(
+            get_current_session_id(),
+            self._sub_agent_lazies[agent_name].get().history_namespace,
+            HumanMessage(content=speculation.agent_input),
+            AIMessage(content=answer)
+        )
+        return answer
 
-        return formatted_result
+    def _format(self, text):
+        # Resolved on the worker thread: the formatter may still be under construction
+        return self.formatter.format_text(text)
+
+    def _run_llm_router(self, agent_input, user_id, speculation=None):
+        # Runs in its own copied context, so the speculation is only visible to this request
+        current_speculation.set(speculation)
+        # Loading history may summarise old turns, so it runs on the worker thread too
+        chat_history = self.history.get_history(str(user_id), self.history_namespace)
+        # Only tracing here: the sub-agents called as tools time their own stages
+        return self.agent.run(input=agent_input, chat_history=chat_history, callbacks=[tracing_callback])
+
+    def _cache_tags(self, agent_name, query):
+        """Data sources a shareable answer depends on, or None if it must not be cached"""
+        if agent_name == DOCUMENT_AGENT:
+            return {DOCUMENTS}
+        if agent_name == DATABASE_AGENT:
+            # Questions about the user's own bookings or profile are personal
+            if self.answer_cache.is_personal(query):
+                return None
+            return {ROOMS}
+        return None
+
+    def _is_error_answer(self, answer):
+        lowered = answer.lower()
+        return any(marker in lowered for marker in (
+            "terjadi kesalahan", "kendala teknis", "something went wrong", "waktu pemrosesan"))
+
+    def get_stats(self) -> dict:
+        return {
+            "agent_pool": self.pool.stats(),
+            "sessions": self.sessions.stats(),
+            "router": self.router.stats(),
+            "planner": self.planner.stats(),
+            "formatter": self.formatter.stats() if self._formatter.initialized else {},
+            "answer_cache": self.answer_cache.stats(),
+            "small_talk": self.small_talk.stats(),
+            "speculation": self.speculator.stats(),
+            "llm": llm_gateway.stats(),
+            "llm_replay": llm_replay.stats(),
+            "startup": startup_report.report(),
+            "stages": stage_metrics.summary(),
+            "tracing": tracer.stats(),
+            "chat_writer": self.chat_writer.stats(),
+            "db_pool": pool_stats(),
+            "db_queries": query_metrics.summary(),
+            "db_tools_pool": sync_pool.stats(),
+            "user_id_cache": user_id_cache.stats(),
+            "schema_catalog": schema_catalog.stats(),
+            "deadline": deadline_stats.as_dict(),
+        }
+
+    def shutdown(self):
+        self.pool.shutdown()
+        sync_pool.close()
@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from agents.router import IntentRouter, TRANSACTION_AGENT
+from utils.deadline import expired, record_hit
+from utils.llm_gateway import get_chat_model
+from utils.logger import logger
+
+# Separators between independent sub-questions
+SPLIT_PATTERN = re.compile(r"\?|;|\n|\b(?:dan juga|dan|serta|lalu|terus|kemudian)\b", re.IGNORECASE)
+MIN_PART_LENGTH = 8
+# TransactionAgent needs room data from DatabaseAgent first, so it is never a parallel branch
+SEQUENTIAL_AGENTS = {TRANSACTION_AGENT}
+
+
+class QueryPlanner:
+    """
+    Planner untuk pertanyaan gabungan yang butuh beberapa sub-agent.
+
+    Pertanyaan dipecah menjadi sub-pertanyaan; jika router yakin setiap
+    bagian milik sub-agent yang berbeda, sub-agent dijalankan bersamaan
+    lalu jawabannya digabung dalam satu langkah sintesis LLM.
+    """
+
+    def __init__(self, router: IntentRouter, model: str = "gpt-4.1-mini"):
+        self.enabled = os.getenv("PLANNER_ENABLED", "true").lower() == "true"
+        self.max_branches = int(os.getenv("PLANNER_MAX_BRANCHES", 3))
+        # Seconds of request budget the synthesis LLM call needs
+        self.deadline_reserve = float(os.getenv("PLANNER_DEADLINE_RESERVE_SECONDS", 3))
+        self.router = router
+        self.model = model
+        self._llm = None
+        self._llm_lock = threading.Lock()
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._plans = 0
+        self._branches = 0
+        self._wall_time = 0.0
+        self._branch_time = 0.0
+
+    def plan(self, query: str) -> Optional[List[Tuple[str, str]]]:
+        """
+        Pecah query menjadi daftar (nama sub-agent, sub-pertanyaan).
+
+        Returns:
+            None jika query tidak perlu (atau tidak bisa) dipecah.
+        """
+        if not self.enabled or not query:
+            return None
+
+        parts = [part.strip(" ,.") for part in SPLIT_PATTERN.split(query)]
+        parts = [part for part in parts if len(part) >= MIN_PART_LENGTH]
+        if len(parts) < 2:
+            return None
+
+        grouped: Dict[str, List[str]] = {}
+        for part in parts:
+            # Not a request of its own: keep it out of the router's stats
+            decision = self.router.route(part, count=False)
+            # Every part needs its own keyword evidence, otherwise fragments like
+            # "kamar mandi" in "kamar mandi dan dapur kotor" would become branches.
+            # One unclear part sends the whole question to the LLM router.
+            if not self.router.is_confident(decision) or decision.source != "keyword":
+                return None
+            if decision.agent in SEQUENTIAL_AGENTS:
+                return None
+            grouped.setdefault(decision.agent, []).append(part)
+
+        if len(grouped) < 2 or len(grouped) > self.max_branches:
+            return None
+
+        plan = [(agent, "; ".join(agent_parts)) for agent, agent_parts in grouped.items()]
+        logger.info(f"Planner fan-out: {plan}")
+        return plan
+
+    def _get_llm(self):
+        with self._llm_lock:
+            if self._llm is None:
+                self._llm = get_chat_model(self.model, temperature=0, stream_to_user=True)
+            return self._llm
+
+    def synthesize(self, query: str, answers: List[Tuple[str, str]]) -> str:
+        """Gabungkan jawaban tiap sub-agent menjadi satu jawaban untuk user"""
+        if len(answers) == 1:
+            # Other branches missed the deadline; nothing to merge
+            return answers[0][1]
+        if expired(self.deadline_reserve):
+            record_hit("synthesize")
+            return "\n\n".join(answer for _, answer in answers)
+
+        sections = "\n\n".join(f"[{agent}]\n{answer}" for agent, answer in answers)
+        prompt = (
+            "Kamu adalah Pak Kos, asisten kos-kosan. Gabungkan jawaban dari beberapa agen berikut "
+            "menjadi satu jawaban yang utuh untuk pertanyaan pengguna. Jangan menambah informasi "
+            "yang tidak ada, pertahankan semua URL apa adanya, dan jawab dalam bahasa Indonesia.\n\n"
+            f"Pertanyaan pengguna: {query}\n\n"
+            f"Jawaban agen:\n{sections}\n\n"
+            "Jawaban gabungan:"
+        )
+        try:
+            return self._get_llm().predict(prompt).strip()
+        except Exception as e:
+            logger.error(f"Error synthesizing planner answers: {e}")
+            return "\n\n".join(answer for _, answer in answers)
+
+    def record(self, branches: int, wall_time: float, branch_time: float):
+        with self._lock:
+            self._plans += 1
+            self._branches += branches
+            self._wall_time += wall_time
+            self._branch_time += branch_time
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "plans": self._plans,
+                "branches": self._branches,
+                "avg_fan_out_ms": round(self._wall_time / self._plans * 1000, 2) if self._plans else 0.0,
+                # What running the same branches one after another would have cost
+                "avg_sequential_ms": round(self._branch_time / self._plans * 1000, 2) if self._plans else 0.0,
+            }
@@ -1,15 +1,20 @@
 import json
 from typing import Optional, List
-from langchain.agents import OpenAIFunctionsAgent, AgentExecutor
+from langchain.agents import OpenAIFunctionsAgent
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     MessagesPlaceholder
 )
 from langchain.schema import SystemMessage, AIMessage, HumanMessage
-from langchain.chat_models import ChatOpenAI
 from tools.qa_tools import setup_document_retriever
 from utils.logger import logger
+from utils.llm_gateway import get_chat_model
+from utils.session_store import session_store, get_current_session_id
+from utils.history import history_manager
+from utils.metrics import agent_callbacks
+from utils.deadline import DeadlineAgentExecutor
+from utils.tracing import span
 
 
 class QAAgentWrapper:
@@ -25,7 +30,7 @@ class QAAgentWrapper:
         """
         self.model = model
         self.temperature = temperature
-        self.chat_history = []
+        self.history_namespace = "qa"
         self.executor = None
         self._initialize_agent()
 
@@ -141,9 +146,10 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
             ])
 
             # Initialize LLM
-            llm = ChatOpenAI(
-                model=self.model,
+            llm = get_chat_model(
+                self.model,
                 temperature=self.temperature,
+                stream_to_user=True,
                 max_tokens=1000  # Reasonable limit for responses
             )
 
@@ -155,7 +161,7 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
             )
 
             # Create executor
-            self.executor = AgentExecutor(
+            self.executor = DeadlineAgentExecutor(
                 agent=agent,
                 tools=doc_tools,
                 verbose=False,
@@ -170,12 +176,13 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
             logger.error(f"Error initializing Q&A Agent: {str(e)}")
             raise
 
-    def ask(self, user_input: str) -> str:
+    def ask(self, user_input: str, record_history: bool = True) -> str:
         """
         Process user question and return response
 
         Args:
             user_input (str): User's question
+            record_history (bool): Simpan giliran ini ke chat history
 
         Returns:
             str: Professional response
@@ -197,14 +204,16 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
 
             result = self.executor.invoke({
                 "input": cleaned_input,
-                "chat_history": self.chat_history
-            })
+                "chat_history": history_manager.get_history(
+                    get_current_session_id(), self.history_namespace)
+            }, config={"callbacks": agent_callbacks()})
 
             # Extract response
             response = result.get("output", "").strip()
 
             # Update chat history
-            self._update_chat_history(cleaned_input, response)
+            if record_history:
+                self._update_chat_history(cleaned_input, response)
 
             # Validate and format response
             if response:
@@ -217,14 +226,15 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
             return self._get_error_response()
 
     def _update_chat_history(self, user_input: str, response: str):
-        """Update chat history with latest interaction"""
+        """Update chat history of the current session with latest interaction"""
         try:
-            self.chat_history.append(HumanMessage(content=user_input))
-            self.chat_history.append(AIMessage(content=response))
-
-            # Limit chat history to last 10 exchanges (20 messages)
-            if len(self.chat_history) > 20:
-                self.chat_history = self.chat_history[-20:]
+            # Older turns beyond the token budget are rolled into a summary
+            history_manager.append(
+                get_current_session_id(),
+                self.history_namespace,
+                HumanMessage(content=user_input),
+                AIMessage(content=response)
+            )
 
         except Exception as e:
             logger.error(f"Error updating chat history: {str(e)}")
@@ -257,21 +267,23 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
             "jika masalah berlanjut."
         )
 
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, record_history: bool = True) -> str:
         """
         Main entry point for the agent (alias for ask method)
 
         Args:
             user_input (str): User's question
+            record_history (bool): Simpan giliran ini ke chat history
 
         Returns:
             str: Professional response
         """
-        return self.ask(user_input)
+        with span(f"agent.{self.history_namespace}"):
+            return self.ask(user_input, record_history)
 
     def clear_history(self):
-        """Clear chat history"""
-        self.chat_history = []
+        """Clear chat history of the current session"""
+        history_manager.clear(get_current_session_id(), self.history_namespace)
         logger.info("Chat history cleared")
 
     def get_agent_info(self) -> dict:
@@ -279,7 +291,8 @@ Ingat: Tujuan Anda adalah memberikan pelayanan informasi terbaik untuk membantu
         return {
             "model": self.model,
             "temperature": self.temperature,
-            "chat_history_length": len(self.chat_history),
+            "chat_history_length": len(session_store.get_history(
+                get_current_session_id(), self.history_namespace)),
             "tools_available": len(self.executor.tools) if self.executor else 0
         }
 
@@ -0,0 +1,239 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+
+DATABASE_AGENT = "DatabaseAgent"
+DOCUMENT_AGENT = "DocumentAgent"
+COMPLAINT_AGENT = "ComplaintAgent"
+TRANSACTION_AGENT = "TransactionAgent"
+
+# Few-shot files used as training data for the nearest-centroid classifier
+FEW_SHOT_FILES = {
+    DATABASE_AGENT: "agents/few_shot/db_few_shot.json",
+    DOCUMENT_AGENT: "agents/few_shot/qa_tools_few_shot.json",
+    COMPLAINT_AGENT: "agents/few_shot/complaint_few_shot.json",
+    TRANSACTION_AGENT: "agents/few_shot/transaction_few_shot.json",
+}
+
+KEYWORD_RULES = {
+    DATABASE_AGENT: [
+        "ketersediaan", "kamar kosong", "masih kosong", "tersedia", "harga",
+        "booking", "pesan kamar", "pesanan", "status kamar", "kamar mana",
+    ],
+    DOCUMENT_AGENT: [
+        "peraturan", "aturan", "jam malam", "tata tertib", "larangan",
+        "dilarang", "kebijakan", "sanksi", "denda",
+    ],
+    COMPLAINT_AGENT: [
+        "keluhan", "komplain", "rusak", "bocor", "tidak dingin", "mampet",
+        "kotor", "bau", "berisik",
+    ],
+    TRANSACTION_AGENT: [
+        "bayar", "pembayaran", "tagihan", "deposit", "transfer", "lunas",
+    ],
+}
+
+STOPWORDS = {
+    "saya", "aku", "yang", "di", "ke", "dan", "atau", "ini", "itu", "apa",
+    "apakah", "ada", "dong", "ya", "mau", "bisa", "tolong", "untuk", "dengan",
+    "dari", "kah", "nya", "the",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class RouteDecision:
+    def __init__(self, agent: Optional[str], confidence: float, source: str):
+        self.agent = agent
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self):
+        return f"RouteDecision(agent={self.agent}, confidence={self.confidence:.2f}, source={self.source})"
+
+
+class IntentRouter:
+    """
+    Router lokal di depan ReAct agent utama.
+
+    Menggabungkan aturan keyword dengan nearest-centroid classifier (TF-IDF)
+    yang dilatih dari contoh few-shot. Keputusan dengan confidence di atas
+    threshold langsung dikirim ke sub-agent; sisanya kembali ke LLM router.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        keyword_boost: float = 0.3,
+        temperature: float = 0.1
+    ):
+        self.enabled = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+        self.threshold = threshold or float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", 0.75))
+        self.keyword_boost = keyword_boost
+        self.temperature = temperature
+
+        self._idf: Dict[str, float] = {}
+        self._centroids: Dict[str, Dict[str, float]] = {}
+        self._train()
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._routed = 0
+        self._fast_path = 0
+        self._fallback = 0
+        self._route_time = 0.0
+        self._fast_time = 0.0
+        self._fallback_time = 0.0
+
+    def _load_examples(self) -> Dict[str, List[str]]:
+        examples: Dict[str, List[str]] = {}
+        for agent, path in FEW_SHOT_FILES.items():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    items = json.load(f)
+                examples[agent] = [
+                    item.get("user_input") or item.get("question", "") for item in items]
+            except FileNotFoundError:
+                logger.warning(f"Router training file not found: {path}")
+                examples[agent] = []
+            # Keywords double as short training examples
+            examples[agent].extend(KEYWORD_RULES[agent])
+        return examples
+
+    def _train(self):
+        examples = self._load_examples()
+        documents = [tokenize(text) for texts in examples.values() for text in texts]
+
+        doc_freq: Counter = Counter()
+        for tokens in documents:
+            doc_freq.update(set(tokens))
+        total = len(documents) or 1
+        self._idf = {
+            token: math.log((1 + total) / (1 + freq)) + 1 for token, freq in doc_freq.items()}
+
+        for agent, texts in examples.items():
+            centroid: Counter = Counter()
+            for text in texts:
+                for token, weight in self._vectorize(text).items():
+                    centroid[token] += weight
+            self._centroids[agent] = self._normalize(dict(centroid))
+
+        logger.info(f"Intent router trained on {len(documents)} examples")
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        counts = Counter(tokenize(text))
+        vector = {token: count * self._idf.get(token, 0.0) for token, count in counts.items()}
+        return self._normalize(vector)
+
+    @staticmethod
+    def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if not norm:
+            return {}
+        return {k: v / norm for k, v in vector.items()}
+
+    def _keyword_hits(self, text: str) -> Dict[str, int]:
+        lowered = text.lower()
+        return {
+            agent: sum(1 for keyword in keywords if keyword in lowered)
+            for agent, keywords in KEYWORD_RULES.items()
+        }
+
+    def route(self, query: str, count: bool = True) -> RouteDecision:
+        """
+        Tentukan sub-agent untuk query beserta confidence-nya.
+
+        count=False untuk klasifikasi internal (mis. bagian-bagian pertanyaan
+        di QueryPlanner) agar statistik router tetap satu per request.
+        """
+        started = time.perf_counter()
+        decision = self._route(query)
+        if count:
+            with self._lock:
+                self._routed += 1
+                self._route_time += time.perf_counter() - started
+        logger.info(f"Router decision: {decision}")
+        return decision
+
+    def _route(self, query: str) -> RouteDecision:
+        if not self.enabled or not query or not query.strip():
+            return RouteDecision(None, 0.0, "disabled")
+
+        vector = self._vectorize(query)
+        hits = self._keyword_hits(query)
+        matched = [agent for agent, count in hits.items() if count]
+
+        scores = {}
+        for agent, centroid in self._centroids.items():
+            similarity = sum(weight * centroid.get(token, 0.0) for token, weight in vector.items())
+            # Keyword boost only when the rules are unambiguous
+            if matched == [agent]:
+                similarity += self.keyword_boost
+            scores[agent] = similarity
+
+        if not any(scores.values()):
+            return RouteDecision(None, 0.0, "no-signal")
+
+        # Softmax over similarities gives a comparable confidence
+        exps = {agent: math.exp(score / self.temperature) for agent, score in scores.items()}
+        total = sum(exps.values())
+        best = max(exps, key=lambda agent: exps[agent])
+        if len(matched) > 1:
+            source = "ambiguous"
+        elif matched == [best]:
+            source = "keyword"
+        else:
+            source = "centroid"
+        return RouteDecision(best, exps[best] / total, source)
+
+    def is_confident(self, decision: RouteDecision) -> bool:
+        # Keyword rules pointing at several agents usually mean a compound question
+        if decision.agent is None or decision.source == "ambiguous":
+            return False
+        # TransactionAgent has no DB tools: the room price must come from DatabaseAgent
+        # first, which only the LLM router chains together
+        if decision.agent == TRANSACTION_AGENT:
+            return False
+        return decision.confidence >= self.threshold
+
+    def record(self, fast_path: bool, duration: float):
+        """
+        Catat hasil satu request agar hit rate dan latency yang dihemat bisa
+        dihitung. Request yang dijalankan QueryPlanner dicatat di planner.
+        """
+        with self._lock:
+            if fast_path:
+                self._fast_path += 1
+                self._fast_time += duration
+            else:
+                self._fallback += 1
+                self._fallback_time += duration
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            finished = self._fast_path + self._fallback
+            avg_fast = self._fast_time / self._fast_path if self._fast_path else 0.0
+            avg_fallback = self._fallback_time / self._fallback if self._fallback else 0.0
+            # Estimated from the average gap between fast-path and LLM-routed requests
+            saved = max(avg_fallback - avg_fast, 0.0) * self._fast_path if self._fallback else 0.0
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "routed": self._routed,
+                "fast_path": self._fast_path,
+                "llm_fallback": self._fallback,
+                "hit_rate": round(self._fast_path / finished, 4) if finished else 0.0,
+                "avg_route_ms": round(self._route_time / self._routed * 1000, 3) if self._routed else 0.0,
+                "avg_fast_path_ms": round(avg_fast * 1000, 2),
+                "avg_llm_fallback_ms": round(avg_fallback * 1000, 2),
+                "est_latency_saved_ms": round(saved * 1000, 2),
+            }
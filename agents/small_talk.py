@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from utils.logger import logger
+
+TEMPLATES_FILE = "agents/few_shot/small_talk_templates.json"
+
+# Words that carry no intent in small talk ("halo pak kos", "makasih ya kak")
+FILLER_WORDS = {
+    "pak", "bapak", "bu", "ibu", "kak", "kakak", "mas", "mbak", "min", "admin",
+    "kos", "kost", "bot", "ya", "yah", "yaa", "dong", "deh", "nih", "sih", "kok",
+    "banyak", "sekali", "bgt", "banget", "semua", "semuanya", "juga", "lagi",
+    "everyone", "all",
+}
+
+
+class SmallTalkMatcher:
+    """
+    Jawaban template untuk sapaan, ucapan terima kasih, dan basa-basi lain.
+
+    Pesan hanya dijawab dari template jika seluruh isinya small talk
+    (setelah filler seperti "pak", "kak", "ya" dibuang); pesan yang masih
+    memuat pertanyaan lain ("halo, kamar 2 masih kosong?") tetap diteruskan
+    ke agent.
+    """
+
+    def __init__(self, path: Optional[str] = None, llm_calls_per_answer: Optional[int] = None):
+        self.enabled = os.getenv("SMALL_TALK_ENABLED", "true").lower() == "true"
+        self.path = path or os.getenv("SMALL_TALK_TEMPLATES", TEMPLATES_FILE)
+        # An agent-answered message costs the LLM router (or a sub-agent) plus the sub-agent chain
+        self.llm_calls_per_answer = llm_calls_per_answer or int(os.getenv("SMALL_TALK_LLM_CALLS_PER_ANSWER", 2))
+
+        self._patterns: Optional[re.Pattern] = None
+        self._intents: Dict[str, str] = {}
+        self._responses: Dict[str, List[str]] = {}
+        self._load()
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._answered: Dict[str, int] = {}
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                templates = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"Small talk templates not found: {self.path}")
+            self.enabled = False
+            return
+
+        phrases = []
+        for template in templates:
+            self._responses[template["intent"]] = template["responses"]
+            for pattern in template["patterns"]:
+                phrase = self.normalize(pattern)
+                self._intents[phrase] = template["intent"]
+                phrases.append(phrase)
+
+        # Longest phrases first so "selamat pagi" wins over "pagi"
+        alternatives = "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+        self._patterns = re.compile(rf"\b(?:{alternatives})\b")
+        logger.info(f"Small talk matcher loaded {len(phrases)} patterns")
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, hapus tanda baca/emoji, dan ringkas huruf berulang ("halooo" -> "halo")"""
+        text = re.sub(r"[^\w\s]", " ", text.lower())
+        text = re.sub(r"(\w)\1{2,}", r"\1", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def match(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns:
+            (intent, jawaban) jika pesan seluruhnya small talk, selain itu None.
+        """
+        if not self.enabled or not text or self._patterns is None:
+            return None
+
+        normalized = self.normalize(text)
+        if not normalized or len(normalized) > 80:
+            return None
+
+        intents = [self._intents[found] for found in self._patterns.findall(normalized)]
+        if not intents:
+            return None
+        leftover = [word for word in self._patterns.sub(" ", normalized).split() if word not in FILLER_WORDS]
+        if leftover:
+            return None
+
+        # The last intent answers "halo, makasih ya" with thanks
+        intent = intents[-1]
+        responses = self._responses[intent]
+        response = responses[zlib.crc32(normalized.encode("utf-8")) % len(responses)]
+        with self._lock:
+            self._answered[intent] = self._answered.get(intent, 0) + 1
+        return intent, response
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            answered = sum(self._answered.values())
+            return {
+                "enabled": self.enabled,
+                "answered": answered,
+                "by_intent": dict(self._answered),
+                "llm_calls_avoided": answered * self.llm_calls_per_answer,
+            }
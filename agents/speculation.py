@@ -0,0 +1,226 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from agents.router import RouteDecision, DOCUMENT_AGENT
+from utils.answer_cache import AnswerCache
+from utils.logger import logger
+
+# DocumentAgent only reads documents, so a discarded run costs nothing but the LLM bill.
+# DatabaseAgent may be added via SPECULATION_AGENTS: its speculative runs are read-only
+DEFAULT_SPECULATIVE_AGENTS = DOCUMENT_AGENT
+
+# The suffix MainAgent appends to every agent input
+TELEGRAM_ID_PATTERN = re.compile(r",?\s*telegram_id\s*=\s*\d+", re.IGNORECASE)
+
+PENDING = "pending"
+RUNNING = "running"
+DISCARDED = "discarded"
+
+# Speculative run available to the LLM router's tools in this request
+current_speculation: ContextVar[Optional["Speculation"]] = ContextVar("current_speculation", default=None)
+
+
+class SpeculativeWriteBlocked(Exception):
+    """Run spekulatif mencoba menulis ke database; jawabannya tidak boleh dipakai"""
+
+
+def _request_words(text: str) -> List[str]:
+    return AnswerCache.normalize(TELEGRAM_ID_PATTERN.sub(" ", text)).split()
+
+
+def same_request(speculated: str, requested: str, threshold: float) -> bool:
+    """True jika input tool dari router meminta hal yang sama dengan input run spekulatif"""
+    speculated_words, requested_words = _request_words(speculated), _request_words(requested)
+    if not speculated_words or not requested_words:
+        return False
+    # A different room, date or kost is a different question however similar the wording
+    if AnswerCache.entities(speculated_words) != AnswerCache.entities(requested_words):
+        return False
+    speculated_set, requested_set = set(speculated_words), set(requested_words)
+    return len(speculated_set & requested_set) / len(speculated_set | requested_set) >= threshold
+
+
+class Speculation:
+    """
+    Satu run sub-agent yang dimulai bersamaan dengan LLM router.
+
+    Jika router memilih sub-agent yang sama, tool-nya mengambil hasil run
+    ini (`claim`) alih-alih menjalankan sub-agent dari awal. Jika router
+    memilih yang lain atau menjawab sendiri, run ini dibuang (`discard`).
+    """
+
+    def __init__(self, speculator: "Speculator", agent_name: str, agent_input: str):
+        self.speculator = speculator
+        self.agent_name = agent_name
+        self.agent_input = agent_input
+        self.result: Future = Future()
+        self.task = None
+        self._lock = threading.Lock()
+        self._state = PENDING
+        self._claimed_at: Optional[float] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def execute(self, func: Callable[[str], str]):
+        """Jalankan sub-agent di worker thread, kecuali run ini sudah dibuang"""
+        with self._lock:
+            if self._state == DISCARDED:
+                return
+            self._state = RUNNING
+            self._started_at = time.perf_counter()
+        try:
+            answer = func(self.agent_input)
+        except Exception as e:
+            answer, error = None, e
+        else:
+            error = None
+        with self._lock:
+            self._finished_at = time.perf_counter()
+            state, claimed_at = self._state, self._claimed_at
+        duration = self._finished_at - self._started_at
+        if state == DISCARDED:
+            self.speculator._record_wasted(duration)
+        elif claimed_at is not None:
+            # Claimed mid-run: the router skipped the part that was already done
+            self.speculator._record_used(claimed_at - self._started_at)
+        if error is not None:
+            self.result.set_exception(error)
+        else:
+            self.result.set_result(answer)
+
+    def claim(self, agent_name: str, agent_input: str) -> Optional[Future]:
+        """
+        Ambil hasil run ini untuk tool `agent_name` dengan input `agent_input`.
+
+        Returns:
+            Future berisi jawaban sub-agent, atau None jika tool harus
+            menjalankan sub-agent sendiri (agent berbeda, input router
+            berbeda, sudah diambil, atau run belum mendapat worker).
+        """
+        if agent_name != self.agent_name:
+            return None
+        if not same_request(self.agent_input, agent_input, self.speculator.input_similarity):
+            # Right agent, different question: the speculative answer would be for the wrong one
+            with self._lock:
+                usable = self._claimed_at is None and self._state != DISCARDED
+            if usable:
+                self.speculator._record_mismatch()
+                self.discard()
+            return None
+        with self._lock:
+            if self._claimed_at is not None or self._state == DISCARDED:
+                return None
+            if self._state == PENDING:
+                # Still queued behind the pool; waiting on it could block the router's own slot
+                self._state = DISCARDED
+                self.speculator._record_late()
+                return None
+            self._claimed_at = time.perf_counter()
+            finished_at = self._finished_at
+        if finished_at is not None:
+            # Already done: the router skipped the whole run
+            self.speculator._record_used(finished_at - self._started_at)
+        return self.result
+
+    def discard(self):
+        """Buang run yang tidak diambil router"""
+        with self._lock:
+            if self._claimed_at is not None:
+                return
+            skipped = self._state == PENDING
+            self._state = DISCARDED
+        if skipped:
+            self.speculator._record_skipped()
+        if self.task is not None and not self.task.done():
+            # Not started yet: leaves the pool queue. Running: the slot returns when the thread ends
+            self.task.cancel()
+
+
+class Speculator:
+    """
+    Speculative execution sub-agent di samping LLM router.
+
+    Untuk query yang tidak cukup yakin untuk fast path, tapi confidence
+    router-nya di atas SPECULATION_THRESHOLD dan agent-nya read-only
+    (SPECULATION_AGENTS), sub-agent langsung dijalankan bersamaan dengan
+    LLM router sehingga satu round trip LLM tersembunyi jika router setuju.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("SPECULATION_ENABLED", "true").lower() == "true"
+        self.threshold = float(os.getenv("SPECULATION_THRESHOLD", 0.45))
+        # Word overlap (Jaccard) needed between the router's tool input and the speculated query
+        self.input_similarity = float(os.getenv("SPECULATION_INPUT_SIMILARITY", 0.6))
+        self.agents = {
+            name.strip() for name in os.getenv("SPECULATION_AGENTS", DEFAULT_SPECULATIVE_AGENTS).split(",")
+            if name.strip()
+        }
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._started = 0
+        self._used = 0
+        self._wasted = 0
+        self._skipped = 0
+        self._late = 0
+        self._mismatched = 0
+        self._saved_time = 0.0
+        self._wasted_time = 0.0
+
+    def should_speculate(self, decision: RouteDecision) -> bool:
+        if not self.enabled or decision.agent not in self.agents or decision.source == "ambiguous":
+            return False
+        return decision.confidence >= self.threshold
+
+    def start(self, decision: RouteDecision, agent_input: str) -> Speculation:
+        with self._lock:
+            self._started += 1
+        logger.info(f"Speculatively running {decision.agent} alongside the LLM router")
+        return Speculation(self, decision.agent, agent_input)
+
+    def _record_used(self, head_start: float):
+        with self._lock:
+            self._used += 1
+            self._saved_time += head_start
+
+    def _record_wasted(self, duration: float):
+        with self._lock:
+            self._wasted += 1
+            self._wasted_time += duration
+
+    def _record_skipped(self):
+        with self._lock:
+            self._skipped += 1
+
+    def _record_late(self):
+        with self._lock:
+            self._late += 1
+
+    def _record_mismatch(self):
+        with self._lock:
+            self._mismatched += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "started": self._started,
+                "used": self._used,
+                "wasted": self._wasted,
+                # Discarded before a worker picked them up: no LLM calls spent
+                "skipped": self._skipped,
+                # The router asked for the agent before the speculative run had a worker
+                "late": self._late,
+                # Same agent, but the router asked it a different question
+                "mismatched": self._mismatched,
+                "hit_rate": round(self._used / self._started, 4) if self._started else 0.0,
+                # Sub-agent time the router did not have to wait for
+                "est_latency_saved_ms": round(self._saved_time * 1000, 2),
+                "wasted_agent_ms": round(self._wasted_time * 1000, 2),
+            }
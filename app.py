@@ -5,7 +5,10 @@ import uvicorn
 
 from bot.api import app as api_app, init_bot
 from bot.bot import TelegramBot
+from database.chat_writer import chat_writer
+from database.connection import close_pool, init_pool
 from utils.logger import logger
+from utils.startup import startup_report
 
 load_dotenv(override=True)
 
@@ -27,6 +30,7 @@ async def start_bot(bot: TelegramBot):
     if (bot.app.updater):
         await bot.app.updater.start_polling()
         logger.info("Telegram bot started")
+        startup_report.mark_ready()
     else:
         logger.info("Telegram bot failed to be started")
 
@@ -45,10 +49,27 @@ async def main():
     if not bot_token:
         raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
-    telegram_bot = TelegramBot(bot_token)
+    with startup_report.measure("telegram_bot"):
+        telegram_bot = TelegramBot(bot_token)
 
     init_bot(telegram_bot)
 
+    # One asyncpg pool for the bot, the API and all repositories
+    try:
+        with startup_report.measure("db_pool"):
+            await init_pool()
+    except Exception as e:
+        # Repositories retry on first use; the bot can still answer from documents
+        logger.error(f"Could not create the PostgreSQL pool at startup: {e}")
+
+    # Build sub-agents ahead of the first message: "background", "blocking" or "off"
+    warmup_mode = os.getenv("AGENT_WARMUP", "background").lower()
+    loop = asyncio.get_running_loop()
+    if warmup_mode == "blocking":
+        await loop.run_in_executor(None, telegram_bot.agent.warm_up)
+    elif warmup_mode == "background":
+        loop.run_in_executor(None, telegram_bot.agent.warm_up)
+
     try:
         await asyncio.gather(
             start_bot(telegram_bot),
@@ -56,6 +77,9 @@ async def main():
         )
     finally:
         await stop_bot(telegram_bot)
+        await chat_writer.stop()
+        await close_pool()
+        telegram_bot.agent.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import os
+import time
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+from utils.logger import logger
+from utils.metrics import stage_metrics
+
+# Lower value is served first
+CALLBACK_PRIORITY = 0
+MESSAGE_PRIORITY = 1
+
+ADMISSION_WAIT = "admission_wait"
+
+
+class SystemBusy(Exception):
+    """Antrian admission penuh; request langsung ditolak"""
+
+
+class Ticket:
+    """
+    Tempat di antrian admission untuk satu request.
+
+    Panggil `await ticket.wait()` sebelum menjalankan agent, dan selalu
+    `ticket.release()` setelahnya (juga jika request batal sebelum giliran).
+    Jika jawaban dijalankan sebagai task lewat `hold_until`, tiket baru
+    dilepas saat task itu selesai.
+    """
+
+    def __init__(self, controller: "AdmissionController", key: Hashable, priority: int, seq: int):
+        self.controller = controller
+        self.key = key
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.released = False
+        self._holder: Optional[asyncio.Future] = None
+
+    async def wait(self):
+        await asyncio.shield(self.granted)
+
+    def hold_until(self, future: asyncio.Future):
+        """
+        Tahan tiket sampai `future` selesai, walaupun handler-nya dibatalkan
+        lebih dulu: worker thread agent tetap berjalan sampai selesai.
+        """
+        self._holder = future
+        future.add_done_callback(self._holder_done)
+
+    def _holder_done(self, future: asyncio.Future):
+        # Retrieve the outcome in case the cancelled handler no longer awaits it
+        if not future.cancelled():
+            future.exception()
+        self.release()
+
+    def release(self):
+        if self._holder is not None and not self._holder.done():
+            # _holder_done releases it once the answer is really finished
+            return
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Admission control di depan agent.
+
+    - Maksimal ADMISSION_MAX_ACTIVE run berjalan bersamaan
+    - Satu run per chat; pesan berikutnya dari chat yang sama menunggu
+      berurutan (FIFO)
+    - Antrian global dibatasi ADMISSION_MAX_QUEUE; jika penuh, request
+      langsung ditolak dengan SystemBusy
+    - Query tombol inline (callback) didahulukan dari pesan teks
+    """
+
+    def __init__(self, max_active: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_active = max_active or int(os.getenv("ADMISSION_MAX_ACTIVE", 16))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("ADMISSION_MAX_QUEUE", 100))
+
+        self._seq = itertools.count()
+        self._waiting: List[Ticket] = []
+        self._active_keys: Set[Hashable] = set()
+        self._active = 0
+
+        # Metrics
+        self._admitted = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._admitted_by_priority: Dict[int, int] = {}
+
+    def reserve(self, key: Hashable, priority: int = MESSAGE_PRIORITY) -> Ticket:
+        """Ambil tempat di antrian, atau raise SystemBusy jika antrian penuh"""
+        ticket = Ticket(self, key, priority, next(self._seq))
+        chat_waiting = any(waiting.key == key for waiting in self._waiting)
+        if self._active < self.max_active and key not in self._active_keys and not chat_waiting:
+            self._grant(ticket)
+            return ticket
+
+        if len(self._waiting) >= self.max_queue:
+            self._rejected += 1
+            logger.warning(f"Admission queue full ({len(self._waiting)}), rejecting request from chat {key}")
+            raise SystemBusy()
+
+        self._waiting.append(ticket)
+        self._waiting.sort(key=lambda waiting: (waiting.priority, waiting.seq))
+        self._max_depth = max(self._max_depth, len(self._waiting))
+        return ticket
+
+    def _grant(self, ticket: Ticket):
+        self._active += 1
+        self._active_keys.add(ticket.key)
+        self._admitted += 1
+        self._admitted_by_priority[ticket.priority] = self._admitted_by_priority.get(ticket.priority, 0) + 1
+        stage_metrics.record(ADMISSION_WAIT, time.perf_counter() - ticket.enqueued_at)
+        ticket.granted.set_result(None)
+
+    def _release(self, ticket: Ticket):
+        if ticket.granted.done():
+            self._active -= 1
+            self._active_keys.discard(ticket.key)
+        else:
+            # Gave up before its turn (cancelled or superseded)
+            self._waiting.remove(ticket)
+            ticket.granted.cancel()
+        self._dispatch()
+
+    def _dispatch(self):
+        """Beri giliran ke tiket terdepan yang chat-nya tidak sedang berjalan"""
+        blocked: Set[Hashable] = set()
+        for ticket in list(self._waiting):
+            if self._active >= self.max_active:
+                break
+            if ticket.key in self._active_keys or ticket.key in blocked:
+                # Keep per-chat order: later tickets of this chat wait too
+                blocked.add(ticket.key)
+                continue
+            self._waiting.remove(ticket)
+            self._grant(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        wait = stage_metrics.summary().get(ADMISSION_WAIT, {})
+        return {
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": len(self._waiting),
+            "max_queue_depth": self._max_depth,
+            "admitted": self._admitted,
+            "admitted_callbacks": self._admitted_by_priority.get(CALLBACK_PRIORITY, 0),
+            "rejected": self._rejected,
+            "wait_p50_ms": wait.get("p50_ms", 0.0),
+            "wait_p95_ms": wait.get("p95_ms", 0.0),
+            "wait_p99_ms": wait.get("p99_ms", 0.0),
+        }
@@ -8,18 +8,28 @@ from database.db_operator.booking import BookingRepository
 from database.db_operator.rooms import RoomsRepository
 from midtrans.client import create_payment_link
 from utils.logger import logger
-from database.connection import DatabaseConnection, database
+from database.connection import DatabaseConnection, close_pool, init_pool, pool_initialized
 from sheets.google_sheets import update_room_colors_in_sheet
+from utils.answer_cache import answer_cache
 
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     await database.connect()
-#     yield
-#     await database.disconnect()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # app.py creates the shared pool before the API starts and closes it itself;
+    # when the API runs on its own the pool belongs to this lifespan
+    owns_pool = not pool_initialized()
+    try:
+        await init_pool()
+    except Exception as e:
+        # Same as app.py: get_pool() retries on first use, so the API still starts
+        logger.warning(f"Could not create the PostgreSQL pool for the API: {e}")
+    yield
+    if owns_pool:
+        await close_pool()
 
 app = FastAPI(title="Telegram Message Blast API",
-              version="1.0.0")
+              version="1.0.0",
+              lifespan=lifespan)
 
 telegram_bot = None
 
@@ -61,6 +71,23 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    if not telegram_bot:
+        raise HTTPException(status_code=503, detail="Bot not initialized")
+
+    return {
+        "timestamp": datetime.now(),
+        **telegram_bot.get_stats()
+    }
+
+
+@app.post("/answer-cache/invalidate")
+async def invalidate_answer_cache(tag: Optional[str] = None):
+    removed = answer_cache.invalidate(tag)
+    return {"status": "success", "invalidated": removed, "tag": tag or "all"}
+
+
 @app.post("/send-messages")
 async def send_messages(request: SingleMessageRequest):
     if not telegram_bot:
@@ -93,7 +120,8 @@ async def send_messages(request: SingleMessageRequest):
 @app.post("/update-room-availability")
 async def update_room_availability():
     try:
-        rows = await database.fetch_all("SELECT room_id, is_available FROM rooms")
+        async with DatabaseConnection() as conn:
+            rows = await conn.fetch("SELECT room_id, is_available FROM rooms")
         room_data = [dict(row) for row in rows]
         update_room_colors_in_sheet(room_data)
 
@@ -1,3 +1,5 @@
+import asyncio
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     Application,
@@ -10,14 +12,28 @@ from telegram.ext import (
 from telegram.error import TelegramError
 
 from agents.main_agent import MainAgent
+from bot.admission import AdmissionController, SystemBusy, CALLBACK_PRIORITY, MESSAGE_PRIORITY
+from bot.coalescer import MessageCoalescer
+from bot.streaming import PlaceholderStreamer
+from utils.streaming import StreamBuffer, current_stream, streaming_enabled
+from utils.metrics import stage, REPLY, REQUEST
+from utils.tracing import tracer
+from utils.deadline import deadline_scope
 
 from utils.logger import logger
 
+PLACEHOLDER_TEXT = "🔄 Mohon Menunggu, Bapak Kos sedang mencari informasi"
+BUSY_TEXT = "⏳ Maaf, sistem sedang sibuk. Silakan coba lagi beberapa saat lagi ya"
+
 
 class TelegramBot:
     def __init__(self, bot_token: str):
         self.agent = MainAgent()
-        self.app = Application.builder().token(bot_token).build()
+        self.coalescer = MessageCoalescer(self._answer_batch)
+        self.admission = AdmissionController()
+        # Updates are handled concurrently; MainAgent's worker pool caps the agent load
+        self.app = Application.builder().token(
+            bot_token).concurrent_updates(True).build()
         self.setup_handlers()
 
     def setup_handlers(self):
@@ -48,14 +64,93 @@ class TelegramBot:
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id if update.effective_user else -1
         if (update.message):
+            if self.coalescer.enabled:
+                await self._handle_coalesced(update, user_id)
+                return
             try:
-                await update.message.reply_text("🔄 Mohon Menunggu, Bapak Kos sedang mencari informasi", parse_mode='Markdown')
-                agent_response = await self.agent.run(update.message.text, user_id)
-                print(agent_response)
-                await update.message.reply_text(agent_response, parse_mode='Markdown')
+                ticket = self.admission.reserve(self._chat_id(update, user_id), MESSAGE_PRIORITY)
+            except SystemBusy:
+                await update.message.reply_text(BUSY_TEXT, parse_mode='Markdown')
+                return
+            try:
+                # The deadline covers the admission wait too: it is what the user waits for
+                with deadline_scope(), tracer.start_trace("telegram.handle_message", user_id=user_id), stage(REQUEST):
+                    placeholder = await update.message.reply_text(PLACEHOLDER_TEXT, parse_mode='Markdown')
+                    await self._answer_admitted(ticket, placeholder, update.message, update.message.text, user_id)
             except Exception as e:
                 print(e)
                 await update.message.reply_text("❌ Pak Kos bingung, bisa coba lebih spesifik lagi ya", parse_mode='Markdown')
+            finally:
+                ticket.release()
+
+    def _chat_id(self, update: Update, user_id: int):
+        return update.effective_chat.id if update.effective_chat else user_id
+
+    async def _handle_coalesced(self, update: Update, user_id: int):
+        """Pesan beruntun dalam window debounce dijawab sekali dengan satu placeholder"""
+        message = update.message
+        # Every message is stored as the user sent it; the merged text is only the agent input
+        await asyncio.gather(
+            self.agent.record_incoming(message.text, user_id),
+            self.coalescer.submit(
+                (self._chat_id(update, user_id), user_id),
+                message.text,
+                message,
+                lambda: message.reply_text(PLACEHOLDER_TEXT, parse_mode='Markdown')
+            )
+        )
+
+    async def _answer_batch(self, key, text, placeholder, message, count):
+        chat_id, user_id = key
+        try:
+            ticket = self.admission.reserve(chat_id, MESSAGE_PRIORITY)
+        except SystemBusy:
+            await message.reply_text(BUSY_TEXT, parse_mode='Markdown')
+            return
+        try:
+            with deadline_scope(), tracer.start_trace("telegram.handle_message", user_id=user_id, messages=count), stage(REQUEST):
+                await self._answer_admitted(ticket, placeholder, message, text, user_id, persist_query=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(e)
+            await message.reply_text("❌ Pak Kos bingung, bisa coba lebih spesifik lagi ya", parse_mode='Markdown')
+        finally:
+            ticket.release()
+
+    async def _answer_admitted(self, ticket, placeholder, message, text, user_id, persist_query=True):
+        """
+        Tunggu giliran admission lalu jawab. Membatalkan handler tidak
+        menghentikan worker thread agent, jadi tiket ditahan sampai jawaban
+        benar-benar selesai, bukan sampai handler keluar.
+        """
+        await ticket.wait()
+        answer = asyncio.ensure_future(self._answer(placeholder, message, text, user_id, persist_query))
+        ticket.hold_until(answer)
+        await asyncio.shield(answer)
+
+    async def _answer(self, placeholder, message, text, user_id, persist_query=True):
+        if streaming_enabled():
+            await self._run_streaming(placeholder, text, user_id, persist_query)
+        else:
+            agent_response = await self.agent.run(text, user_id, persist_query=persist_query)
+            print(agent_response)
+            with stage(REPLY):
+                await message.reply_text(agent_response, parse_mode='Markdown')
+
+    async def _run_streaming(self, placeholder, text, user_id, persist_query=True):
+        """Run the agent while streaming its final LLM step into the placeholder message"""
+        buffer = StreamBuffer()
+        current_stream.set(buffer)
+        streamer = PlaceholderStreamer(placeholder, buffer)
+        streamer.start()
+        try:
+            agent_response = await self.agent.run(text, user_id, persist_query=persist_query)
+        finally:
+            await streamer.stop()
+            current_stream.set(None)
+        with stage(REPLY):
+            await streamer.finish(agent_response)
 
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
@@ -65,11 +160,26 @@ class TelegramBot:
             await query.answer()
             logger.info(f"Callback data: {query.data}")
             if query.data and query.message:
-                # type: ignore
-                await query.message.reply_text("🔄 Mohon Menunggu, Bapak Kos sedang mencari informasi", parse_mode='Markdown') # type: ignore
-                agent_response = self.agent.run(query.data, user_id)
-                # type: ignore
-                await query.message.reply_text(agent_response, parse_mode='Markdown') # type: ignore
+                try:
+                    # Button queries jump ahead of queued text messages
+                    ticket = self.admission.reserve(self._chat_id(update, user_id), CALLBACK_PRIORITY)
+                except SystemBusy:
+                    await query.message.reply_text(BUSY_TEXT, parse_mode='Markdown') # type: ignore
+                    return
+                try:
+                    with deadline_scope(), tracer.start_trace("telegram.button_callback", user_id=user_id, data=query.data):
+                        # type: ignore
+                        placeholder = await query.message.reply_text(PLACEHOLDER_TEXT, parse_mode='Markdown') # type: ignore
+                        await self._answer_admitted(ticket, placeholder, query.message, query.data, user_id)
+                finally:
+                    ticket.release()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.agent.get_stats(),
+            "coalescer": self.coalescer.stats(),
+            "admission": self.admission.stats(),
+        }
 
     async def send_message_to_user(self, user_id: int, message: str, parse_mode: str = "Markdown") -> bool:
         try:
@@ -0,0 +1,136 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from utils.logger import logger
+
+
+class _Batch:
+    def __init__(self):
+        self.texts: List[str] = []
+        self.waiters: List[asyncio.Future] = []
+        self.placeholder: Optional[asyncio.Future] = None
+        self.message: Any = None
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        # Run of the previous batch of this chat, still in progress when this batch was opened
+        self.previous: Optional[asyncio.Task] = None
+
+
+class MessageCoalescer:
+    """
+    Gabungkan pesan beruntun dari satu chat menjadi satu pemanggilan agent.
+
+    Setiap pesan baru memulai ulang window debounce (TELEGRAM_DEBOUNCE_SECONDS).
+    Saat window habis tanpa pesan baru, semua pesan dikirim ke handler
+    sebagai satu teks. Run yang sudah sampai ke handler tidak pernah
+    dibatalkan: worker thread agent tidak bisa dihentikan, jadi run itu tetap
+    menulis history dan menjalankan tool. Pesan yang datang saat handler
+    berjalan masuk ke batch baru (dengan placeholder sendiri) yang baru
+    dikirim setelah run sebelumnya selesai. Batch langsung dikirim jika sudah
+    berisi TELEGRAM_COALESCE_MAX_MESSAGES pesan. Window 0 (default)
+    mematikan penggabungan.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, str, Any, Any, int], Awaitable[None]],
+        window: Optional[float] = None,
+        max_messages: Optional[int] = None
+    ):
+        self.handler = handler
+        self.window = window if window is not None else float(os.getenv("TELEGRAM_DEBOUNCE_SECONDS", 0))
+        self.max_messages = max_messages or int(os.getenv("TELEGRAM_COALESCE_MAX_MESSAGES", 5))
+        self._batches: Dict[Hashable, _Batch] = {}
+
+        # Metrics
+        self._messages = 0
+        self._completed_runs = 0
+        self._answered_messages = 0
+        self._followups = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(
+        self,
+        key: Hashable,
+        text: str,
+        message: Any,
+        send_placeholder: Callable[[], Awaitable[Any]]
+    ):
+        """
+        Tambahkan pesan ke batch chat `key` dan tunggu sampai batch yang
+        memuat pesan ini selesai dijawab.
+        """
+        self._messages += 1
+        batch = self._batches.get(key)
+        if batch is not None and batch.running:
+            # Too late to merge: answer this message in a follow-up run once the current one is done
+            self._followups += 1
+            logger.info(f"Message for chat {key} queued behind its in-flight answer")
+            previous = batch.task
+            batch = None
+        else:
+            previous = None
+        if batch is None:
+            batch = _Batch()
+            batch.previous = previous
+            self._batches[key] = batch
+        elif batch.task and not batch.task.done():
+            # Still debouncing: restart the window with this message included
+            batch.task.cancel()
+
+        batch.texts.append(text)
+        batch.message = message
+        if batch.placeholder is None:
+            batch.placeholder = asyncio.ensure_future(send_placeholder())
+
+        waiter = asyncio.get_running_loop().create_future()
+        batch.waiters.append(waiter)
+
+        delay = 0 if len(batch.texts) >= self.max_messages else self.window
+        batch.task = asyncio.create_task(self._dispatch(key, batch, delay))
+        await waiter
+
+    async def _dispatch(self, key: Hashable, batch: _Batch, delay: float):
+        await asyncio.sleep(delay)
+        if batch.previous is not None:
+            # One run per chat; asyncio.wait leaves the previous run alone if this window restarts
+            await asyncio.wait([batch.previous])
+
+        batch.running = True
+        try:
+            placeholder = await batch.placeholder
+            await self.handler(key, "\n".join(batch.texts), placeholder, batch.message, len(batch.texts))
+        except Exception as e:
+            self._finish(key, batch, error=e)
+            return
+        self._finish(key, batch)
+
+    def _finish(self, key: Hashable, batch: _Batch, error: Optional[Exception] = None):
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        self._completed_runs += 1
+        self._answered_messages += len(batch.texts)
+        for waiter in batch.waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window,
+            "messages": self._messages,
+            "agent_runs": self._completed_runs,
+            # Messages answered without an agent run of their own
+            "coalesced_messages": self._answered_messages - self._completed_runs,
+            # Messages that arrived while their chat was being answered
+            "followup_messages": self._followups,
+            "pending_chats": len(self._batches),
+        }
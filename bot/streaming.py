@@ -0,0 +1,69 @@
+import asyncio
+import os
+from typing import Optional
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from utils.logger import logger
+from utils.streaming import StreamBuffer
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+CURSOR = " ▌"
+
+
+class PlaceholderStreamer:
+    """
+    Mengedit pesan placeholder "Mohon Menunggu" secara berkala dengan token
+    yang sudah diterima dari LLM, lalu menggantinya dengan jawaban final.
+
+    Edit dibatasi minimal satu kali per `interval` detik agar tetap di bawah
+    rate limit edit Telegram.
+    """
+
+    def __init__(self, message: Message, buffer: StreamBuffer, interval: Optional[float] = None):
+        self.message = message
+        self.buffer = buffer
+        self.interval = interval or float(os.getenv("TELEGRAM_STREAM_EDIT_INTERVAL", 1.0))
+        self._last_text = ""
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._pump())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _pump(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            text = self.buffer.visible_text()
+            if not text or text == self._last_text:
+                continue
+
+            preview = text[:TELEGRAM_MAX_MESSAGE_LENGTH - len(CURSOR)] + CURSOR
+            try:
+                # Partial text is sent without parse_mode: unfinished Markdown fails to parse
+                await self.message.edit_text(preview)
+                self._last_text = text
+            except RetryAfter as e:
+                await asyncio.sleep(float(e.retry_after))
+            except TelegramError as e:
+                logger.warning(f"Failed to stream partial reply: {e}")
+
+    async def finish(self, final_text: str):
+        """Hentikan streaming dan tampilkan jawaban final di placeholder"""
+        await self.stop()
+        try:
+            await self.message.edit_text(final_text, parse_mode='Markdown')
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            # Formatter output is not always valid Markdown
+            await self.message.edit_text(final_text)
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+
+from database.db_operator.chat import ChatRepository
+from utils.logger import logger
+
+# Tells the writer loop to flush what it has and stop
+_STOP = None
+
+# Errors caused by the record itself: retrying or spilling it cannot help
+BAD_RECORD_ERRORS = (ValueError, TypeError, asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+
+class ChatWriter:
+    """
+    Write-behind untuk log chat di tabel messages.
+
+    `write()` hanya memasukkan record ke antrian in-memory; task background
+    mengambilnya dan menyimpan per batch (maksimal CHAT_WRITER_BATCH_SIZE
+    record atau setiap CHAT_WRITER_FLUSH_INTERVAL detik) dengan satu
+    executemany. Jika Postgres tidak bisa dihubungi, atau antrian penuh,
+    record ditulis ke CHAT_WRITER_SPILL_FILE (JSONL) dan dikirim ulang
+    setelah Postgres kembali. Batch yang ditolak karena isi record-nya
+    diulang per baris; record yang tetap ditolak (dan baris spill yang
+    rusak) dipindah ke CHAT_WRITER_QUARANTINE_FILE agar tidak menahan
+    record lain. Saat shutdown, sisa antrian di-flush.
+    """
+
+    def __init__(self, repository: Optional[ChatRepository] = None):
+        self.enabled = os.getenv("CHAT_WRITER_ENABLED", "true").lower() == "true"
+        self.batch_size = int(os.getenv("CHAT_WRITER_BATCH_SIZE", 100))
+        self.flush_interval = float(os.getenv("CHAT_WRITER_FLUSH_INTERVAL", 0.5))
+        self.max_queue = int(os.getenv("CHAT_WRITER_MAX_QUEUE", 10000))
+        self.shutdown_timeout = float(os.getenv("CHAT_WRITER_SHUTDOWN_TIMEOUT", 10))
+        # Empty disables spilling: records are dropped while Postgres is down
+        self.spill_file = os.getenv("CHAT_WRITER_SPILL_FILE", "chat_spill.jsonl")
+        # Empty drops rejected records instead of keeping them for inspection
+        self.quarantine_file = os.getenv("CHAT_WRITER_QUARANTINE_FILE", "chat_quarantine.jsonl")
+        self.repository = repository or ChatRepository()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._spill_pending = bool(self.spill_file) and (
+            os.path.exists(self.spill_file) or os.path.exists(self._replay_file))
+
+        # Metrics
+        self._written = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._dropped = 0
+        self._quarantined = 0
+        self._flush_time = 0.0
+
+    @property
+    def _replay_file(self) -> str:
+        return f"{self.spill_file}.replay"
+
+    async def write(
+        self,
+        user_id: int,
+        chat_type: str,
+        role: str,
+        chat: str,
+        sent_at: Optional[datetime] = None
+    ):
+        """Simpan satu pesan chat; kembali tanpa menunggu Postgres jika write-behind aktif"""
+        if not self.enabled:
+            await self.repository.insert_chat(
+                user_id=user_id, chat_type=chat_type, role=role, chat=chat, sent_at=sent_at)
+            return
+
+        ChatRepository.validate_chat(chat_type, role, chat)
+        record = {
+            "user_id": user_id,
+            "chat_type": chat_type,
+            "role": role,
+            "chat": chat,
+            "sent_at": sent_at or datetime.utcnow(),
+        }
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            logger.warning(f"Chat writer queue full ({self.max_queue}), spilling message")
+            self._spill([record])
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        await self._replay_spill()
+        while True:
+            record = await self._queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            flush_at = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = flush_at - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            if await self._write_batch(batch) and self._spill_pending:
+                await self._replay_spill()
+            if stopping:
+                return
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """Simpan batch; False jika Postgres tidak bisa dipakai dan sisanya sudah di-spill"""
+        started = time.perf_counter()
+        try:
+            await self.repository.insert_chats(batch)
+        except BAD_RECORD_ERRORS as e:
+            self._failed_batches += 1
+            logger.error(f"Chat writer batch of {len(batch)} messages rejected, retrying row by row: {e}")
+            return await self._write_rows(batch)
+        except Exception as e:
+            self._failed_batches += 1
+            logger.error(f"Chat writer failed to store {len(batch)} messages: {e}")
+            self._spill(batch)
+            return False
+        self._batches += 1
+        self._written += len(batch)
+        self._flush_time += time.perf_counter() - started
+        return True
+
+    async def _write_rows(self, batch: List[Dict[str, Any]]) -> bool:
+        """Simpan satu per satu agar satu record yang ditolak tidak menahan yang lain"""
+        for index, record in enumerate(batch):
+            try:
+                await self.repository.insert_chats([record])
+            except BAD_RECORD_ERRORS as e:
+                self._quarantine([{**self._dump(record), "error": str(e)}])
+                continue
+            except Exception as e:
+                logger.error(f"Chat writer failed to store {len(batch) - index} messages: {e}")
+                self._spill(batch[index:])
+                return False
+            self._written += 1
+        return True
+
+    @staticmethod
+    def _dump(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {**record, "sent_at": record["sent_at"].isoformat()}
+
+    def _spill(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        if not self.spill_file:
+            self._dropped += len(records)
+            return
+        try:
+            with open(self.spill_file, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(self._dump(record)) + "\n")
+        except OSError as e:
+            logger.error(f"Chat writer could not spill {len(records)} messages: {e}")
+            self._dropped += len(records)
+            return
+        self._spilled += len(records)
+        self._spill_pending = True
+
+    def _quarantine(self, entries: List[Dict[str, Any]]):
+        """Simpan record yang ditolak beserta alasannya; tidak pernah dikirim ulang otomatis"""
+        logger.error(f"Chat writer quarantined {len(entries)} messages: {entries[0]['error']}")
+        if not self.quarantine_file:
+            self._dropped += len(entries)
+            return
+        try:
+            with open(self.quarantine_file, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.error(f"Chat writer could not quarantine {len(entries)} messages: {e}")
+            self._dropped += len(entries)
+            return
+        self._quarantined += len(entries)
+
+    async def _replay_spill(self):
+        """Kirim ulang record yang tertunda di spill file"""
+        replay_file = self._replay_file
+        leftover = bool(self.spill_file) and os.path.exists(replay_file)
+        if not self.spill_file or not (leftover or os.path.exists(self.spill_file)):
+            self._spill_pending = False
+            return
+
+        # Failed chunks are spilled again to a fresh file while this one is read
+        try:
+            if leftover:
+                # An earlier replay was interrupted: finish it before the spill file overwrites it
+                logger.warning(f"Chat writer resuming interrupted replay {replay_file}")
+                self._spill_pending = os.path.exists(self.spill_file)
+            else:
+                os.replace(self.spill_file, replay_file)
+                self._spill_pending = False
+            with open(replay_file, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+        except OSError as e:
+            logger.error(f"Chat writer could not read spill file {replay_file}: {e}")
+            return
+
+        records, corrupt = [], []
+        for line in lines:
+            try:
+                record = json.loads(line)
+                record["sent_at"] = datetime.fromisoformat(record["sent_at"])
+            except (ValueError, TypeError, KeyError) as e:
+                corrupt.append({"line": line.rstrip("\n"), "error": f"corrupt spill line: {e}"})
+                continue
+            records.append(record)
+        if corrupt:
+            self._quarantine(corrupt)
+
+        replayed = 0
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            if not await self._write_batch(chunk):
+                self._spill(records[start + self.batch_size:])
+                break
+            replayed += len(chunk)
+        self._replayed += replayed
+        os.remove(replay_file)
+        logger.info(f"Chat writer replayed {replayed} of {len(records)} spilled messages")
+
+    async def stop(self):
+        """Flush sisa antrian lalu hentikan task background"""
+        if self._task is None:
+            return
+        task, queue = self._task, self._queue
+        self._task = None
+        await queue.put(_STOP)
+        try:
+            await asyncio.wait_for(task, self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            # The batch being written when the task was cancelled is lost
+            logger.error("Chat writer did not finish flushing in time, spilling the rest")
+            remaining = []
+            while not queue.empty():
+                record = queue.get_nowait()
+                if record is not _STOP:
+                    remaining.append(record)
+            self._spill(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "written": self._written,
+            "batches": self._batches,
+            "avg_batch_size": round(self._written / self._batches, 2) if self._batches else 0.0,
+            "avg_flush_ms": round(self._flush_time / self._batches * 1000, 2) if self._batches else 0.0,
+            "failed_batches": self._failed_batches,
+            "spilled": self._spilled,
+            "replayed": self._replayed,
+            "quarantined": self._quarantined,
+            "dropped": self._dropped,
+        }
+
+
+chat_writer = ChatWriter()
@@ -1,35 +1,215 @@
+import asyncio
 import os
+import random
+import threading
+import time
 import asyncpg
 from dotenv import load_dotenv
 from utils.logger import logger
+from utils.tracing import span
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
+# Shared asyncpg pool for the bot, the API and every repository
+_pool = None
+_pool_lock = asyncio.Lock()
+_pool_metrics = {
+    "acquired": 0,
+    "acquire_timeouts": 0,
+    "total_acquire_wait": 0.0,
+    "max_acquire_wait": 0.0,
+}
+
+
+def _acquire_timeout() -> float:
+    return float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 5))
+
+
+async def init_pool(dsn=DATABASE_URL):
+    """Buat pool asyncpg bersama; dipanggil saat startup, aman dipanggil berulang"""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            min_size = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+            max_size = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+            with span("db.pool.init"):
+                _pool = await asyncpg.create_pool(
+                    dsn,
+                    min_size=min_size,
+                    max_size=max_size,
+                    statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100)),
+                    max_inactive_connection_lifetime=float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300)),
+                )
+            logger.info(f"PostgreSQL pool ready: min={min_size}, max={max_size}")
+    return _pool
+
+
+async def get_pool():
+    """Pool bersama, dibuat saat pertama dipakai jika startup belum membuatnya"""
+    return _pool if _pool is not None else await init_pool()
+
+
+def pool_initialized() -> bool:
+    return _pool is not None
+
+
+async def close_pool():
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            pool, _pool = _pool, None
+            await pool.close()
+            logger.info("PostgreSQL pool closed.")
+
+
+def pool_stats() -> dict:
+    """Ukuran pool dan metrik acquire"""
+    acquired = _pool_metrics["acquired"]
+    stats = {
+        "initialized": _pool is not None,
+        "acquired": acquired,
+        "acquire_timeouts": _pool_metrics["acquire_timeouts"],
+        "avg_acquire_wait_ms": round(_pool_metrics["total_acquire_wait"] / acquired * 1000, 3) if acquired else 0.0,
+        "max_acquire_wait_ms": round(_pool_metrics["max_acquire_wait"] * 1000, 3),
+    }
+    if _pool is not None:
+        stats.update({
+            "min_size": _pool.get_min_size(),
+            "max_size": _pool.get_max_size(),
+            "size": _pool.get_size(),
+            "idle": _pool.get_idle_size(),
+        })
+    return stats
+
+
 class DatabaseConnection:
+    """
+    Koneksi dari pool bersama selama blok `async with`.
+
+    DSN selain DATABASE_URL (misalnya untuk script) tetap membuka koneksi
+    sendiri.
+    """
+
     def __init__(self, dsn=DATABASE_URL):
         self.dsn = dsn
         self.conn = None
+        self.pool = None
 
     async def __aenter__(self):
         try:
-            self.conn = await asyncpg.connect(self.dsn)
-            logger.info("Successfully connected to PostgreSQL database.")
+            if self.dsn != DATABASE_URL:
+                with span("db.connect"):
+                    self.conn = await asyncpg.connect(self.dsn)
+                logger.info("Successfully connected to PostgreSQL database.")
+                return self.conn
+
+            self.pool = await get_pool()
+            started = time.perf_counter()
+            with span("db.acquire"):
+                self.conn = await self.pool.acquire(timeout=_acquire_timeout())
+            wait = time.perf_counter() - started
+            _pool_metrics["acquired"] += 1
+            _pool_metrics["total_acquire_wait"] += wait
+            _pool_metrics["max_acquire_wait"] = max(_pool_metrics["max_acquire_wait"], wait)
             return self.conn
+        except asyncio.TimeoutError:
+            _pool_metrics["acquire_timeouts"] += 1
+            logger.error("Timed out waiting for a PostgreSQL pool connection")
+            raise
         except Exception as e:
             logger.error(f"Failed to connect to PostgreSQL: {e}")
             raise
 
     async def __aexit__(self, exc_type, exc, tb):
-        if self.conn:
+        if self.conn is None:
+            return
+        if self.pool is not None:
+            await self.pool.release(self.conn)
+        else:
             await self.conn.close()
             logger.info("Database connection closed.")
+        self.conn = None
+
+class QueryMetrics:
+    """
+    Metrik ringkas per operasi repository: jumlah panggilan, error, baris,
+    dan durasi. Menggantikan log query/parameter/hasil lengkap di setiap
+    panggilan.
+    """
+
+    def __init__(self):
+        self.slow_query_ms = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def record(self, op: str, duration: float, rows: int, failed: bool = False):
+        with self._lock:
+            stats = self._ops.setdefault(op, {"calls": 0, "errors": 0, "rows": 0, "total": 0.0, "max": 0.0})
+            stats["calls"] += 1
+            stats["rows"] += rows
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            if failed:
+                stats["errors"] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                op: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "rows": stats["rows"],
+                    "avg_ms": round(stats["total"] / stats["calls"] * 1000, 3),
+                    "max_ms": round(stats["max"] * 1000, 3),
+                }
+                for op, stats in self._ops.items()
+            }
+
+
+query_metrics = QueryMetrics()
+
+
+def _log_sample_rate() -> float:
+    return float(os.getenv("DB_LOG_SAMPLE_RATE", 0))
+
 
 class BaseRepository:
+    """
+    Lapisan eksekusi query untuk repository.
+
+    Setiap panggilan dicatat sebagai metrik ringkas (durasi dan jumlah
+    baris) di query_metrics; query, parameter, dan hasil lengkap hanya
+    di-log untuk sebagian panggilan jika DB_LOG_SAMPLE_RATE > 0. Prepared
+    statement di-cache per koneksi oleh asyncpg (DB_STATEMENT_CACHE_SIZE),
+    dan karena koneksi berasal dari pool, cache tersebut dipakai ulang
+    antar request.
+    """
+
     def __init__(self):
         pass
 
+    async def _run(self, op: str, conn, method: str, query: str, args: tuple):
+        started = time.perf_counter()
+        try:
+            with span(f"db.{op}", query=query):
+                result = await getattr(conn, method)(query, *args)
+        except Exception as e:
+            query_metrics.record(op, time.perf_counter() - started, 0, failed=True)
+            logger.error(f"{op} failed: {e} | Query: {query}")
+            raise
+
+        duration = time.perf_counter() - started
+        rows = len(result) if method == "fetch" else int(result is not None)
+        query_metrics.record(op, duration, rows)
+        if duration * 1000 >= query_metrics.slow_query_ms:
+            logger.warning(f"Slow {op} ({duration * 1000:.0f} ms, {rows} rows): {query}")
+        sample_rate = _log_sample_rate()
+        if sample_rate and random.random() < sample_rate:
+            logger.info(f"{op} executed: {query} | Params: {args} | Result: {result}")
+        return result
+
     async def insert(self, conn, query: str, *args):
         """
         Execute an INSERT SQL statement.
@@ -42,13 +222,7 @@ class BaseRepository:
         Returns:
             The inserted record.
         """
-        try:
-            result = await conn.fetchrow(query, *args)
-            logger.info(f"Insert executed: {query} | Params: {args} | Result: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Insert failed: {e} | Query: {query} | Params: {args}")
-            raise
+        return await self._run("insert", conn, "fetchrow", query, args)
 
     async def delete(self, conn, query: str, *args):
         """
@@ -62,13 +236,7 @@ class BaseRepository:
         Returns:
             The deleted record.
         """
-        try:
-            result = await conn.fetchrow(query, *args)
-            logger.info(f"Delete executed: {query} | Params: {args} | Result: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Delete failed: {e} | Query: {query} | Params: {args}")
-            raise
+        return await self._run("delete", conn, "fetchrow", query, args)
 
     async def select_one(self, conn, query: str, *args):
         """
@@ -82,13 +250,7 @@ class BaseRepository:
         Returns:
             The first matching record or None.
         """
-        try:
-            result = await conn.fetchrow(query, *args)
-            logger.info(f"Select one executed: {query} | Params: {args} | Result: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Select one failed: {e} | Query: {query} | Params: {args}")
-            raise
+        return await self._run("select_one", conn, "fetchrow", query, args)
 
     async def fetch_all(self, conn, query: str, *args):
         """
@@ -102,13 +264,7 @@ class BaseRepository:
         Returns:
             List of records matching the query.
         """
-        try:
-            results = await conn.fetch(query, *args)
-            logger.info(f"Fetch all executed: {query} | Params: {args} | Records: {len(results)}")
-            return results
-        except Exception as e:
-            logger.error(f"Fetch all failed: {e} | Query: {query} | Params: {args}")
-            raise
+        return await self._run("fetch_all", conn, "fetch", query, args)
 
     async def update(self, conn, query: str, *args):
         """
@@ -122,13 +278,7 @@ class BaseRepository:
         Returns:
             The updated record.
         """
-        try:
-            result = await conn.fetchrow(query, *args)
-            logger.info(f"Update executed: {query} | Params: {args} | Result: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Update failed: {e} | Query: {query} | Params: {args}")
-            raise
+        return await self._run("update", conn, "fetchrow", query, args)
 
     async def execute_query(self, conn, query: str, *args):
         """
@@ -142,13 +292,4 @@ class BaseRepository:
         Returns:
             Query result.
         """
-        try:
-            result = await conn.fetch(query, *args)
-            logger.info(f"Custom query executed: {query} | Params: {args} | Result: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Custom query execution failed: {e} | Query: {query} | Params: {args}")
-            raise
-
-from databases import Database
-database = Database(os.getenv("DATABASE_URL", ""))
+        return await self._run("execute_query", conn, "fetch", query, args)
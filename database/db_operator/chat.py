@@ -31,18 +31,14 @@ class ChatRepository:
             Inserted message_id.
         """
         users_db = UsersRepository()
-
-        if chat_type not in ('IN', 'OUT'):
-            raise ValueError("chat_type must be 'IN' or 'OUT'")
-        if role not in ('AGENT', 'USER'):
-            raise ValueError("role must be 'AGENT' or 'USER'")
-        if not chat:
-            raise ValueError("chat cannot be empty")
+        self.validate_chat(chat_type, role, chat)
 
         try:
-            async with DatabaseConnection() as conn:
-                internal_user_id = await users_db.insert_user(telegram_id=user_id)
+            # Resolved before taking a pool connection: holding one while
+            # insert_user waits for another can exhaust the pool
+            internal_user_id = await users_db.insert_user(telegram_id=user_id)
 
+            async with DatabaseConnection() as conn:
                 query = f"""
                     INSERT INTO {self.table_name} (user_id, chat_type, role, chat, sent_at)
                     VALUES ($1, $2, $3, $4, $5)
@@ -64,6 +60,58 @@ class ChatRepository:
             logger.error(f"Error inserting chat message: {e}")
             raise
 
+    @staticmethod
+    def validate_chat(chat_type: str, role: str, chat: str):
+        if chat_type not in ('IN', 'OUT'):
+            raise ValueError("chat_type must be 'IN' or 'OUT'")
+        if role not in ('AGENT', 'USER'):
+            raise ValueError("role must be 'AGENT' or 'USER'")
+        if not chat:
+            raise ValueError("chat cannot be empty")
+
+    async def insert_chats(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of chat messages with one executemany round trip.
+
+        Args:
+            records: Dicts with the insert_chat arguments (user_id is the Telegram ID).
+
+        Returns:
+            Number of inserted messages.
+        """
+        if not records:
+            return 0
+
+        users_db = UsersRepository()
+        # One user lookup per distinct sender instead of one per message
+        internal_user_ids = {}
+        for telegram_id in {record["user_id"] for record in records}:
+            internal_user_ids[telegram_id] = await users_db.insert_user(telegram_id=telegram_id)
+
+        query = f"""
+            INSERT INTO {self.table_name} (user_id, chat_type, role, chat, sent_at)
+            VALUES ($1, $2, $3, $4, $5)
+        """
+        rows = [
+            (
+                internal_user_ids[record["user_id"]],
+                record["chat_type"],
+                record["role"],
+                record["chat"],
+                record.get("sent_at") or datetime.utcnow(),
+            )
+            for record in records
+        ]
+
+        try:
+            async with DatabaseConnection() as conn:
+                await conn.executemany(query, rows)
+            logger.info(f"Inserted {len(rows)} chat messages")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error inserting chat messages: {e}")
+            raise
+
     async def get_chat_history(
         self,
         user_id: int,
@@ -2,6 +2,7 @@ from typing import Any, List, Dict
 import logging
 
 from database.connection import BaseRepository
+from utils.answer_cache import answer_cache, ROOMS
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +54,8 @@ class RoomsRepository:
             await repo.execute_query(conn, query, is_available, int(room_id))
             logger.info(
                 f"Updated room_id {room_id} availability to {is_available}")
+            # Cached availability answers are stale now
+            answer_cache.invalidate(ROOMS)
         except Exception as e:
             logger.error(f"Failed to update room availability: {e}")
             raise
@@ -1,9 +1,71 @@
+import os
+import threading
+from collections import OrderedDict
 from utils.logger import logger
 from typing import Optional
 from datetime import datetime
 from database.connection import DatabaseConnection
 
 
+class UserIdCache:
+    """
+    LRU cache telegram_id -> user_id internal.
+
+    Pesan dari user yang sudah dikenal tidak perlu lookup ke tabel users.
+    Harus di-invalidate setiap kali tabel users diubah di luar
+    UsersRepository (misalnya lewat run_pg_query).
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("USER_ID_CACHE_MAX_ENTRIES", 10000))
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get(self, telegram_id) -> Optional[int]:
+        with self._lock:
+            user_id = self._entries.get(str(telegram_id))
+            if user_id is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(str(telegram_id))
+            self._hits += 1
+            return user_id
+
+    def put(self, telegram_id, user_id: int):
+        with self._lock:
+            self._entries[str(telegram_id)] = user_id
+            self._entries.move_to_end(str(telegram_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id=None):
+        """Hapus satu telegram_id, atau seluruh cache jika tidak diberikan"""
+        with self._lock:
+            self._invalidations += 1
+            if telegram_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(telegram_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self._invalidations,
+            }
+
+
+user_id_cache = UserIdCache()
+
+
 class UsersRepository:
     def __init__(self):
         self.table_name = "users"
@@ -17,7 +79,10 @@ class UsersRepository:
         created_at: Optional[datetime] = None
     ) -> int:
         """
-        Insert a new user into the users table after checking for existing user.
+        Get the user_id of an existing user, or insert a new one, in a single round trip.
+
+        Users are matched on telegram_id or email. Known telegram_ids are
+        answered from user_id_cache without touching the database.
 
         Returns:
             The inserted or existing user_id.
@@ -26,6 +91,11 @@ class UsersRepository:
         if not telegram_id and not email:
             raise ValueError("At least one of 'telegram_id' or 'email' must be provided.")
 
+        if telegram_id:
+            cached = user_id_cache.get(telegram_id)
+            if cached is not None:
+                return cached
+
         if not full_name or not full_name.strip():
             full_name = f'{telegram_id}@TELEGRAM' if telegram_id else 'Anonymous'
         full_name_clean = full_name.strip()
@@ -36,17 +106,7 @@ class UsersRepository:
         else:
             email_clean = email.strip()
 
-        # Check if user exists
-        check_sql = f"""
-            SELECT user_id FROM {self.table_name}
-            WHERE email = $1 { 'OR telegram_id = $2' if telegram_id else '' }
-        """
-
-        check_params = [email_clean]
-        if telegram_id:
-            check_params.append(str(telegram_id))
-
-        # Build insert query dynamically
+        # Build insert columns dynamically
         columns = ["full_name", "email"]
         values = [full_name_clean, email_clean]
 
@@ -60,31 +120,66 @@ class UsersRepository:
             columns.append("created_at")
             values.append(created_at)
 
-        placeholders = [f"${i+1}" for i in range(len(values))]
-        insert_sql = f"""
-            INSERT INTO {self.table_name} ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-            RETURNING user_id
+        # INSERT ... SELECT cannot infer parameter types from the target columns
+        placeholders = [
+            f"${i+1}::{'timestamptz' if column == 'created_at' else 'text'}"
+            for i, column in enumerate(columns)
+        ]
+        email_param = "$2"
+        telegram_param = f"${columns.index('telegram_id') + 1}" if telegram_id else None
+
+        # Existing user first (telegram_id match preferred); otherwise insert.
+        # Bare ON CONFLICT DO NOTHING needs no constraint on users.email. With
+        # a unique index on email (recommended:
+        # CREATE UNIQUE INDEX users_email_key ON users (email)), a concurrent
+        # insert of the same email returns no row here, and the retry below
+        # picks up the winner. Without it, such a race can still add a duplicate row.
+        upsert_sql = f"""
+            WITH existing AS (
+                SELECT user_id FROM {self.table_name}
+                WHERE email = {email_param} {f'OR telegram_id = {telegram_param}' if telegram_id else ''}
+                ORDER BY {f'(telegram_id = {telegram_param}) DESC NULLS LAST' if telegram_id else 'user_id'}
+                LIMIT 1
+            ), inserted AS (
+                INSERT INTO {self.table_name} ({', '.join(columns)})
+                SELECT {', '.join(placeholders)}
+                WHERE NOT EXISTS (SELECT 1 FROM existing)
+                ON CONFLICT DO NOTHING
+                RETURNING user_id
+            )
+            SELECT user_id FROM existing
+            UNION ALL
+            SELECT user_id FROM inserted
+            LIMIT 1
         """
 
         try:
             async with DatabaseConnection() as conn:
-                logger.info("Checking if user already exists...")
-                result = await conn.fetchrow(check_sql, *check_params)
-                if result:
-                    user_id = result["user_id"]
-                    logger.info(f"User already exists with id {user_id}")
-                    return user_id
-
-                logger.info("Inserting new user...")
-                result = await conn.fetchrow(insert_sql, *values)
+                result = await conn.fetchrow(upsert_sql, *values)
                 if not result:
-                    logger.error("Insert did not return user_id")
-                    raise ValueError("Insert failed")
-                user_id = result["user_id"]
-                logger.info(f"Inserted user with id {user_id}")
-                return user_id
+                    # Lost an insert race; the winner's row is committed and visible now
+                    result = await conn.fetchrow(upsert_sql, *values)
+            if not result:
+                logger.error("Upsert did not return user_id")
+                raise ValueError("Insert failed")
+            user_id = result["user_id"]
+            if telegram_id:
+                user_id_cache.put(telegram_id, user_id)
+            return user_id
 
         except Exception as e:
             logger.error(f"Failed to insert user: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    async def get_internal_user_id(self, conn, telegram_id) -> Optional[int]:
+        """user_id internal untuk telegram_id, atau None jika user belum terdaftar"""
+        cached = user_id_cache.get(telegram_id)
+        if cached is not None:
+            return cached
+
+        result = await conn.fetchrow(
+            f"SELECT user_id FROM {self.table_name} WHERE telegram_id = $1 LIMIT 1", str(telegram_id))
+        if not result:
+            return None
+        user_id_cache.put(telegram_id, result["user_id"])
+        return result["user_id"]
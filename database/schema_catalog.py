@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from database.sync_pool import sync_pool
+from utils.logger import logger
+
+# Every public table with its columns, constraints and secondary indexes in one round trip.
+# Indexes that back a PRIMARY KEY/UNIQUE constraint are left out: the constraint already says it.
+CATALOG_QUERY = """
+    SELECT
+        c.relname,
+        COALESCE((
+            SELECT json_agg(json_build_array(
+                       a.attname,
+                       format_type(a.atttypid, a.atttypmod),
+                       NOT a.attnotnull,
+                       pg_get_expr(d.adbin, d.adrelid)
+                   ) ORDER BY a.attnum)
+            FROM pg_attribute a
+            LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_array(
+                       con.contype,
+                       (SELECT json_agg(a.attname ORDER BY k.ord)
+                        FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum),
+                       CASE WHEN con.contype = 'f' THEN con.confrelid::regclass::text END,
+                       (SELECT json_agg(a.attname ORDER BY k.ord)
+                        FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                        JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum)
+                   ) ORDER BY con.contype, con.conname)
+            FROM pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype IN ('p', 'f', 'u')
+        ), '[]'),
+        COALESCE((
+            SELECT json_agg(json_build_array(
+                       ic.relname,
+                       regexp_replace(pg_get_indexdef(i.indexrelid), '^.* USING ', '')
+                   ) ORDER BY ic.relname)
+            FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            WHERE i.indrelid = c.oid
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        ), '[]')
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname;
+"""
+
+PRIMARY_KEY = "p"
+FOREIGN_KEY = "f"
+UNIQUE = "u"
+
+
+class TableSchema:
+    """Kolom, constraint, dan index satu tabel dari CATALOG_QUERY"""
+
+    def __init__(self, name: str, columns: List[list], constraints: List[list], indexes: List[list]):
+        self.name = name
+        # (column_name, data_type, nullable, default)
+        self.columns = [tuple(column) for column in columns]
+        self.primary_key: List[str] = []
+        self.unique: List[List[str]] = []
+        # (columns, referenced_table, referenced_columns)
+        self.foreign_keys: List[tuple] = []
+        for contype, keys, ref_table, ref_keys in constraints:
+            if contype == PRIMARY_KEY:
+                self.primary_key = keys
+            elif contype == UNIQUE:
+                self.unique.append(keys)
+            elif contype == FOREIGN_KEY:
+                self.foreign_keys.append((keys, ref_table, ref_keys))
+        # (index_name, "btree (column)")
+        self.indexes = [tuple(index) for index in indexes]
+
+    def describe(self) -> str:
+        """Format lengkap untuk tool describe_tables"""
+        lines = [f"Table: {self.name}"]
+        for column_name, data_type, nullable, default in self.columns:
+            lines.append(
+                f"  {column_name}: {data_type}, Nullable: {'YES' if nullable else 'NO'}, Default: {default}")
+        if self.primary_key:
+            lines.append(f"  Primary key: ({', '.join(self.primary_key)})")
+        for keys in self.unique:
+            lines.append(f"  Unique: ({', '.join(keys)})")
+        for keys, ref_table, ref_keys in self.foreign_keys:
+            lines.append(f"  Foreign key: ({', '.join(keys)}) -> {ref_table}({', '.join(ref_keys)})")
+        for index_name, definition in self.indexes:
+            lines.append(f"  Index: {index_name} {definition}")
+        return "\n".join(lines)
+
+    def compact(self) -> str:
+        """Satu baris per tabel untuk prompt, mis. `rooms(room_id int PK, kost_id int FK kosts.kost_id, ...)`"""
+        references = {}
+        for keys, ref_table, ref_keys in self.foreign_keys:
+            if len(keys) == 1:
+                references[keys[0]] = f"{ref_table}.{ref_keys[0]}"
+        unique = {keys[0] for keys in self.unique if len(keys) == 1}
+
+        parts = []
+        for column_name, data_type, nullable, _ in self.columns:
+            part = f"{column_name} {data_type}"
+            if self.primary_key == [column_name]:
+                part += " PK"
+            if column_name in references:
+                part += f" FK {references[column_name]}"
+            if column_name in unique:
+                part += " UNIQUE"
+            if not nullable and self.primary_key != [column_name]:
+                part += " NOT NULL"
+            parts.append(part)
+        line = f"{self.name}({', '.join(parts)})"
+        # Composite keys don't fit on a column
+        if len(self.primary_key) > 1:
+            line += f" PK({', '.join(self.primary_key)})"
+        for keys, ref_table, ref_keys in self.foreign_keys:
+            if len(keys) > 1:
+                line += f" FK({', '.join(keys)}) -> {ref_table}({', '.join(ref_keys)})"
+        return line
+
+
+class SchemaCatalog:
+    """
+    Cache skema database untuk tool list_tables / describe_tables.
+
+    Seluruh skema public (kolom, primary/foreign key, unique, index) dimuat
+    dengan satu query ke pg_catalog, lalu disimpan in-process selama
+    SCHEMA_CATALOG_TTL_SECONDS. DDL yang dijalankan lewat run_pg_query
+    memanggil `invalidate()` sehingga pemakaian berikutnya memuat ulang.
+    Teks skema ringkas untuk prompt dirender sekali per load.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.enabled = os.getenv("SCHEMA_CATALOG_ENABLED", "true").lower() == "true"
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SCHEMA_CATALOG_TTL_SECONDS", 3600))
+        # Put the compact schema in the DB agent's system prompt instead of making it call the tools
+        self.in_prompt = os.getenv("SCHEMA_CATALOG_IN_PROMPT", "false").lower() == "true"
+
+        self._tables: Optional[Dict[str, TableSchema]] = None
+        self._prompt_text = ""
+        self._loaded_at = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._hits = 0
+        self._loads = 0
+        self._load_time = 0.0
+        self._failures = 0
+        self._invalidations = 0
+
+    def _is_fresh(self) -> bool:
+        if self._tables is None or self._stale:
+            return False
+        return time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def tables(self) -> Dict[str, TableSchema]:
+        """Skema per nama tabel; dimuat ulang jika kosong, kedaluwarsa, atau di-invalidate"""
+        if not self.enabled:
+            return self._load()
+
+        with self._lock:
+            if self._is_fresh():
+                self._hits += 1
+                return self._tables
+            try:
+                tables = self._load()
+            except Exception as e:
+                self._failures += 1
+                if self._tables is None:
+                    raise
+                # A stale schema beats no schema while the database is unreachable
+                logger.warning(f"Schema catalog reload failed, serving stale schema: {e}")
+                return self._tables
+            self._tables = tables
+            self._prompt_text = "\n".join(table.compact() for table in tables.values())
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            return tables
+
+    def _load(self) -> Dict[str, TableSchema]:
+        started = time.perf_counter()
+        conn = sync_pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(CATALOG_QUERY)
+                rows = cursor.fetchall()
+        finally:
+            sync_pool.putconn(conn)
+
+        tables = {name: TableSchema(name, columns, constraints, indexes)
+                  for name, columns, constraints, indexes in rows}
+        duration = time.perf_counter() - started
+        self._loads += 1
+        self._load_time += duration
+        logger.info(f"Schema catalog loaded {len(tables)} tables in {duration * 1000:.0f} ms")
+        return tables
+
+    def table_names(self) -> List[str]:
+        return list(self.tables())
+
+    def describe(self, table_names: Iterable[str]) -> str:
+        tables = self.tables()
+        descriptions = []
+        for name in table_names:
+            table = tables.get(name.strip().lower())
+            descriptions.append(table.describe() if table else f"Table: {name}\n  (table not found)")
+        return "\n\n".join(descriptions)
+
+    def prompt_text(self) -> str:
+        """Skema ringkas (satu baris per tabel) untuk system prompt"""
+        try:
+            tables = self.tables()
+        except Exception as e:
+            logger.error(f"Schema catalog unavailable for prompt: {e}")
+        else:
+            if not self.enabled:
+                return "\n".join(table.compact() for table in tables.values())
+        with self._lock:
+            return self._prompt_text or "(skema tidak tersedia, gunakan tool describe_tables)"
+
+    def invalidate(self):
+        with self._lock:
+            if self._tables is not None:
+                self._invalidations += 1
+            # The old tables stay as the fallback if the reload fails
+            self._stale = True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_prompt": self.in_prompt,
+                "tables": len(self._tables) if self._tables is not None else 0,
+                "hits": self._hits,
+                "loads": self._loads,
+                "avg_load_ms": round(self._load_time / self._loads * 1000, 2) if self._loads else 0.0,
+                "failures": self._failures,
+                "invalidations": self._invalidations,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._tables is not None else None,
+            }
+
+
+schema_catalog = SchemaCatalog()
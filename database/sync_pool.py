@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import ThreadedConnectionPool
+
+from database.connection import DATABASE_URL
+from utils.deadline import remaining
+from utils.logger import logger
+
+
+class PoolTimeout(Exception):
+    """Tidak ada koneksi pool yang bebas dalam DB_TOOLS_POOL_ACQUIRE_TIMEOUT detik"""
+
+
+class SyncConnectionPool:
+    """
+    Pool psycopg2 untuk kode blocking di worker thread agent (db_tools).
+
+    - Maksimal DB_TOOLS_POOL_MAX_SIZE koneksi; thread berikutnya menunggu
+      (ThreadedConnectionPool sendiri langsung error jika penuh)
+    - DB_TOOLS_POOL_MIN_SIZE koneksi tetap terbuka di antara pemakaian
+    - Koneksi yang tertutup atau lama menganggur dicek dulu dengan
+      `SELECT 1` dan diganti jika rusak
+    - Setiap pemakaian memasang statement_timeout: DB_TOOLS_STATEMENT_TIMEOUT_MS,
+      dipersingkat sampai sisa deadline request
+    """
+
+    def __init__(self, dsn: str = DATABASE_URL):
+        self.dsn = dsn
+        self.max_size = int(os.getenv("DB_TOOLS_POOL_MAX_SIZE", 8))
+        self.min_size = min(int(os.getenv("DB_TOOLS_POOL_MIN_SIZE", 4)), self.max_size)
+        self.acquire_timeout = float(os.getenv("DB_TOOLS_POOL_ACQUIRE_TIMEOUT", 5))
+        self.statement_timeout_ms = int(os.getenv("DB_TOOLS_STATEMENT_TIMEOUT_MS", 15000))
+        self.health_check_idle = float(os.getenv("DB_TOOLS_HEALTH_CHECK_IDLE_SECONDS", 30))
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        # id(connection) -> time.monotonic() it was last returned
+        self._last_used: Dict[int, float] = {}
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._replaced = 0
+        self._health_checks = 0
+        self._total_wait = 0.0
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.min_size, self.max_size, self.dsn)
+                logger.info(f"db_tools connection pool ready: min={self.min_size}, max={self.max_size}")
+            return self._pool
+
+    def getconn(self):
+        """Ambil koneksi sehat dengan autocommit dan statement_timeout terpasang"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"No database connection available within {self.acquire_timeout}s")
+        conn = None
+        try:
+            pool = self._get_pool()
+            conn = self._get_healthy_conn(pool)
+            with conn.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", (self._statement_timeout(),))
+        except Exception:
+            try:
+                if conn is not None:
+                    self._discard(pool, conn)
+            finally:
+                self._slots.release()
+            raise
+
+        with self._lock:
+            self._checkouts += 1
+            self._total_wait += time.perf_counter() - started
+        return conn
+
+    def _get_healthy_conn(self, pool: ThreadedConnectionPool):
+        # After a database restart every idle connection may be dead, so replacements are checked too
+        for _ in range(self.max_size + 1):
+            conn = pool.getconn()
+            try:
+                # Before any query: a fresh connection would otherwise open an implicit
+                # transaction, and autocommit cannot be switched inside one
+                if not conn.closed:
+                    conn.autocommit = True
+                healthy = self._is_healthy(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logger.warning(f"Replacing broken db_tools connection: {e}")
+                healthy = False
+            except Exception:
+                self._discard(pool, conn)
+                raise
+            if healthy:
+                return conn
+            self._discard(pool, conn)
+            with self._lock:
+                self._replaced += 1
+        raise psycopg2.OperationalError("No healthy database connection for db_tools")
+
+    def _discard(self, pool: ThreadedConnectionPool, conn):
+        self._last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+
+    def putconn(self, conn, broken: bool = False):
+        """
+        Kembalikan koneksi. Koneksi yang tertutup, atau tidak idle (transaksi
+        gagal di tengah jalan, status tidak diketahui), ditutup dan tidak
+        dipakai ulang.
+        """
+        try:
+            pool = self._get_pool()
+            if broken or conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                self._discard(pool, conn)
+                return
+            pool.putconn(conn)
+            if conn.closed:
+                # The pool closes connections above min_size instead of keeping them
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+        finally:
+            self._slots.release()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_idle:
+            return True
+        with self._lock:
+            self._health_checks += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning(f"Replacing broken db_tools connection: {e}")
+            return False
+
+    def _statement_timeout(self) -> int:
+        timeout_ms = self.statement_timeout_ms
+        left = remaining()
+        if left is not None:
+            timeout_ms = min(timeout_ms, max(int(left * 1000), 1))
+        return timeout_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "initialized": self._pool is not None,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "acquire_timeouts": self._timeouts,
+                "replaced_connections": self._replaced,
+                "health_checks": self._health_checks,
+                "avg_checkout_ms": round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            }
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+                self._last_used.clear()
+
+
+sync_pool = SyncConnectionPool()
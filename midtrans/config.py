@@ -1,10 +1,24 @@
 import os
 from dotenv import load_dotenv
 import midtransclient
+import requests
+
+from utils.deadline import timeout_for
 
 load_dotenv()
 
 
+class _TimeoutRequests:
+    """Pengganti modul requests di HttpClient Midtrans yang selalu memakai timeout"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return requests.request(*args, **kwargs)
+
+
 def create_midtrans_client():
     server_key = os.getenv("MIDTRANS_SERVER_KEY", "")
     is_sandbox = True
@@ -13,4 +27,7 @@ def create_midtrans_client():
         is_production=not is_sandbox,
         server_key=server_key
     )
+    # midtransclient calls requests without a timeout; bound it by the request deadline
+    timeout = timeout_for(float(os.getenv("MIDTRANS_TIMEOUT_SECONDS", 15)))
+    snap.http_client.http_client = _TimeoutRequests(timeout)
     return snap
@@ -1,10 +1,13 @@
 import os
+import threading
 from typing import Any, Dict, List
 from dotenv import load_dotenv
 import gspread
 from google.oauth2.service_account import Credentials
 from gspread_formatting import CellFormat, Color, format_cell_range
 
+from utils.startup import startup_report
+
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
 load_dotenv()
@@ -21,11 +24,24 @@ service_account_info = {
     "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
     "client_x509_cert_url": "https://www.googleapis.com/robot/v1/metadata/x509/pak-kos%40playground-461814.iam.gserviceaccount.com"
 }
-credentials = Credentials.from_service_account_info(
-    service_account_info,
-    scopes=SCOPES
-)
-gc = gspread.authorize(credentials)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> gspread.Client:
+    """Authorize the gspread client on first use instead of at import time"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                with startup_report.measure("google_sheets"):
+                    credentials = Credentials.from_service_account_info(
+                        service_account_info,
+                        scopes=SCOPES
+                    )
+                    _client = gspread.authorize(credentials)
+    return _client
+
 
 SPREADSHEET_ID = "1wVXA5nGxWwkjb3yEqQIohshgIEG0-pH0NQvgomnEdsA"
 SHEET_NAME = "Sheet1"
@@ -44,7 +60,7 @@ room_id_to_cell = {
 def update_room_colors_in_sheet(
     room_availability: List[Dict[str, Any]],
 ):
-    sh = gc.open_by_key(SPREADSHEET_ID)
+    sh = get_client().open_by_key(SPREADSHEET_ID)
     worksheet = sh.worksheet(SHEET_NAME)
 
     for room in room_availability:
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from bot.admission import AdmissionController, SystemBusy, CALLBACK_PRIORITY, MESSAGE_PRIORITY
+
+
+def test_callbacks_are_admitted_before_messages():
+    async def scenario():
+        admission = AdmissionController(max_active=1, max_queue=10)
+        running = admission.reserve("a")
+        message = admission.reserve("b", MESSAGE_PRIORITY)
+        callback = admission.reserve("c", CALLBACK_PRIORITY)
+        assert not message.granted.done() and not callback.granted.done()
+
+        running.release()
+        assert callback.granted.done() and not message.granted.done()
+        callback.release()
+        assert message.granted.done()
+        message.release()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == 3
+    assert stats["admitted_callbacks"] == 1
+    assert stats["active"] == 0
+
+
+def test_full_queue_sheds_with_system_busy():
+    async def scenario():
+        admission = AdmissionController(max_active=1, max_queue=1)
+        admission.reserve("a")
+        admission.reserve("b")
+        with pytest.raises(SystemBusy):
+            admission.reserve("c")
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 1
+
+
+def test_one_run_per_chat_in_order():
+    async def scenario():
+        admission = AdmissionController(max_active=4, max_queue=10)
+        first = admission.reserve("chat")
+        second = admission.reserve("chat")
+        third = admission.reserve("chat")
+        other = admission.reserve("other")
+        # Free slots do not let a chat run twice at once
+        assert first.granted.done() and other.granted.done()
+        assert not second.granted.done() and not third.granted.done()
+
+        first.release()
+        assert second.granted.done() and not third.granted.done()
+        second.release()
+        assert third.granted.done()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_active=1, max_queue=10)
+        running = admission.reserve("a")
+        waiting = admission.reserve("b")
+        task = asyncio.ensure_future(waiting.wait())
+        await asyncio.sleep(0)
+        task.cancel()
+        waiting.release()
+        running.release()
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queue_depth"] == 0
+    assert stats["active"] == 0
+
+
+def test_ticket_is_held_until_the_answer_finishes():
+    async def scenario():
+        admission = AdmissionController(max_active=1, max_queue=10)
+        ticket = admission.reserve("chat")
+        done = asyncio.Event()
+
+        async def answer():
+            await done.wait()
+
+        async def handler():
+            try:
+                await ticket.wait()
+                task = asyncio.ensure_future(answer())
+                ticket.hold_until(task)
+                await asyncio.shield(task)
+            finally:
+                ticket.release()
+
+        handling = asyncio.ensure_future(handler())
+        await asyncio.sleep(0)
+        handling.cancel()
+        await asyncio.gather(handling, return_exceptions=True)
+
+        # The handler is gone but the answer is still running: the next message waits
+        follow_up = admission.reserve("chat")
+        assert not follow_up.granted.done()
+
+        done.set()
+        await asyncio.sleep(0.01)
+        assert follow_up.granted.done()
+
+    asyncio.run(scenario())
@@ -0,0 +1,43 @@
+from utils.answer_cache import AnswerCache, ROOMS
+
+
+def make_cache():
+    cache = AnswerCache(threshold=0.85, ttl_seconds=600, max_entries=16)
+    cache.enabled = True
+    return cache
+
+
+def test_similar_question_hits():
+    cache = make_cache()
+    cache.put("apakah kamar nomor 2 masih kosong sekarang?", "Kamar 2 masih kosong.", {ROOMS})
+    assert cache.get("apakah kamar nomor 2 masih kosong sekarang ya") == "Kamar 2 masih kosong."
+
+
+def test_different_room_number_misses():
+    cache = make_cache()
+    cache.put("apakah kamar nomor 2 masih kosong sekarang?", "Kamar 2 masih kosong.", {ROOMS})
+    assert cache.get("apakah kamar nomor 3 masih kosong sekarang?") is None
+
+    cache.put("berapa harga sewa kamar 1 per bulan?", "Rp1.500.000", {ROOMS})
+    assert cache.get("berapa harga sewa kamar 5 per bulan?") is None
+
+
+def test_different_kost_name_misses():
+    cache = make_cache()
+    cache.put("berapa harga kamar di kos melati per bulan sekarang", "Rp1.500.000", {ROOMS})
+    assert cache.get("berapa harga kamar di kos mawar per bulan sekarang") is None
+
+
+def test_negated_question_misses():
+    cache = make_cache()
+    cache.put("kamar mana yang kosong", "Kamar 2 dan 4.", {ROOMS})
+    assert cache.get("kamar mana yang tidak kosong") is None
+    assert cache.get("kamar mana yang belum kosong") is None
+
+
+def test_personal_questions_match_whole_words():
+    assert AnswerCache.is_personal("cek pesanan saya dong")
+    assert AnswerCache.is_personal("update nomor hp aku")
+    # "pesan" inside another word, "saya" inside "sayap"
+    assert not AnswerCache.is_personal("apakah ada kamar dekat gedung sayap timur")
+    assert not AnswerCache.is_personal("berapa harga kamar yang dipesan paling banyak")
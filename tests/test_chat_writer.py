@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from database.chat_writer import ChatWriter
+
+
+class FakeRepository:
+    """insert_chats palsu: gagal selama `down`, dan menolak record berisi "BAD" """
+
+    def __init__(self):
+        self.down = False
+        self.calls = []
+        self.stored = []
+
+    async def insert_chats(self, records):
+        self.calls.append(len(records))
+        if self.down:
+            raise ConnectionError("connection refused")
+        if any(record["chat"] == "BAD" for record in records):
+            raise ValueError("invalid byte sequence")
+        self.stored.extend(record["chat"] for record in records)
+        return len(records)
+
+
+@pytest.fixture
+def writer(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHAT_WRITER_ENABLED", "true")
+    monkeypatch.setenv("CHAT_WRITER_FLUSH_INTERVAL", "0.01")
+    monkeypatch.setenv("CHAT_WRITER_SPILL_FILE", str(tmp_path / "spill.jsonl"))
+    monkeypatch.setenv("CHAT_WRITER_QUARANTINE_FILE", str(tmp_path / "quarantine.jsonl"))
+    return lambda: ChatWriter(FakeRepository())
+
+
+async def write_all(writer, chats):
+    for chat in chats:
+        await writer.write(42, "IN", "USER", chat)
+
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def spill_line(chat):
+    return json.dumps({"user_id": 42, "chat_type": "IN", "role": "USER", "chat": chat,
+                       "sent_at": datetime(2026, 1, 1).isoformat()}) + "\n"
+
+
+def test_messages_are_written_in_one_batch(writer):
+    chat_writer = writer()
+
+    async def scenario():
+        await write_all(chat_writer, ["a", "b", "c"])
+        await chat_writer.stop()
+
+    asyncio.run(scenario())
+    assert chat_writer.repository.calls == [3]
+    assert chat_writer.repository.stored == ["a", "b", "c"]
+    assert chat_writer.stats()["batches"] == 1
+
+
+def test_rejected_record_is_quarantined_and_the_rest_written(writer):
+    chat_writer = writer()
+
+    async def scenario():
+        await write_all(chat_writer, ["a", "BAD", "c"])
+        await chat_writer.stop()
+
+    asyncio.run(scenario())
+    assert chat_writer.repository.stored == ["a", "c"]
+    quarantined = read_lines(chat_writer.quarantine_file)
+    assert [entry["chat"] for entry in quarantined] == ["BAD"]
+    assert "invalid byte sequence" in quarantined[0]["error"]
+    assert not os.path.exists(chat_writer.spill_file)
+    stats = chat_writer.stats()
+    assert stats["quarantined"] == 1
+    assert stats["written"] == 2
+
+
+def test_outage_spills_and_replays(writer):
+    chat_writer = writer()
+
+    async def scenario():
+        chat_writer.repository.down = True
+        await write_all(chat_writer, ["a", "b"])
+        await asyncio.sleep(0.05)
+        assert [entry["chat"] for entry in read_lines(chat_writer.spill_file)] == ["a", "b"]
+
+        chat_writer.repository.down = False
+        await write_all(chat_writer, ["c"])
+        await chat_writer.stop()
+
+    asyncio.run(scenario())
+    assert chat_writer.repository.stored == ["c", "a", "b"]
+    assert not os.path.exists(chat_writer.spill_file)
+    assert chat_writer.stats()["replayed"] == 2
+
+
+def test_corrupt_spill_line_does_not_block_replay(writer):
+    chat_writer = writer()
+    with open(chat_writer.spill_file, "w", encoding="utf-8") as f:
+        f.write(spill_line("a") + '{"user_id": 42, "chat": "tru\n' + spill_line("b"))
+    chat_writer = writer()
+
+    async def scenario():
+        await write_all(chat_writer, ["c"])
+        await chat_writer.stop()
+
+    asyncio.run(scenario())
+    assert chat_writer.repository.stored == ["a", "b", "c"]
+    assert "corrupt spill line" in read_lines(chat_writer.quarantine_file)[0]["error"]
+    assert not os.path.exists(f"{chat_writer.spill_file}.replay")
+
+
+def test_interrupted_replay_is_not_overwritten(writer):
+    chat_writer = writer()
+    with open(f"{chat_writer.spill_file}.replay", "w", encoding="utf-8") as f:
+        f.write(spill_line("old"))
+    with open(chat_writer.spill_file, "w", encoding="utf-8") as f:
+        f.write(spill_line("new"))
+    chat_writer = writer()
+
+    async def scenario():
+        await write_all(chat_writer, ["c"])
+        await chat_writer.stop()
+
+    asyncio.run(scenario())
+    assert sorted(chat_writer.repository.stored) == ["c", "new", "old"]
+    assert not os.path.exists(chat_writer.spill_file)
+    assert not os.path.exists(f"{chat_writer.spill_file}.replay")
@@ -0,0 +1,116 @@
+import asyncio
+
+from bot.coalescer import MessageCoalescer
+
+
+class Recorder:
+    """Handler palsu yang mencatat setiap run dan bisa ditahan sampai dilepas"""
+
+    def __init__(self):
+        self.runs = []
+        self.finished = []
+        self.release = None
+
+    async def handler(self, key, text, placeholder, message, count):
+        self.runs.append((text, placeholder, count))
+        if self.release is not None:
+            await self.release.wait()
+        self.finished.append(text)
+
+
+def placeholder(name):
+    async def send():
+        return name
+    return send
+
+
+def test_messages_in_window_are_answered_once():
+    async def scenario():
+        recorder = Recorder()
+        coalescer = MessageCoalescer(recorder.handler, window=0.05)
+        first = asyncio.ensure_future(coalescer.submit(1, "halo", None, placeholder("p1")))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(coalescer.submit(1, "kamar kosong?", None, placeholder("p2")))
+        await asyncio.gather(first, second)
+        return recorder, coalescer
+
+    recorder, coalescer = asyncio.run(scenario())
+    assert recorder.runs == [("halo\nkamar kosong?", "p1", 2)]
+    stats = coalescer.stats()
+    assert stats["agent_runs"] == 1
+    assert stats["coalesced_messages"] == 1
+    assert stats["pending_chats"] == 0
+
+
+def test_batch_is_sent_at_max_messages():
+    async def scenario():
+        recorder = Recorder()
+        coalescer = MessageCoalescer(recorder.handler, window=10, max_messages=2)
+        await asyncio.wait_for(asyncio.gather(
+            coalescer.submit(1, "a", None, placeholder("p")),
+            coalescer.submit(1, "b", None, placeholder("p")),
+        ), timeout=1)
+        return recorder
+
+    assert asyncio.run(scenario()).runs == [("a\nb", "p", 2)]
+
+
+def test_message_during_run_does_not_cancel_it():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release = asyncio.Event()
+        coalescer = MessageCoalescer(recorder.handler, window=0.01)
+        first = asyncio.ensure_future(coalescer.submit(1, "harga kamar?", None, placeholder("p1")))
+        while not recorder.runs:
+            await asyncio.sleep(0.005)
+
+        second = asyncio.ensure_future(coalescer.submit(1, "yang AC", None, placeholder("p2")))
+        await asyncio.sleep(0.05)
+        # The follow-up waits for the in-flight run instead of starting a second one
+        assert len(recorder.runs) == 1
+
+        recorder.release.set()
+        await asyncio.gather(first, second)
+        return recorder, coalescer
+
+    recorder, coalescer = asyncio.run(scenario())
+    assert recorder.finished == ["harga kamar?", "yang AC"]
+    assert recorder.runs[1] == ("yang AC", "p2", 1)
+    assert coalescer.stats()["followup_messages"] == 1
+
+
+def test_other_chats_are_not_blocked():
+    async def scenario():
+        recorder = Recorder()
+        recorder.release = asyncio.Event()
+        coalescer = MessageCoalescer(recorder.handler, window=0.01)
+        first = asyncio.ensure_future(coalescer.submit(1, "chat satu", None, placeholder("p1")))
+        second = asyncio.ensure_future(coalescer.submit(2, "chat dua", None, placeholder("p2")))
+        while len(recorder.runs) < 2:
+            await asyncio.sleep(0.005)
+        recorder.release.set()
+        await asyncio.gather(first, second)
+        return recorder
+
+    assert sorted(text for text, _, _ in asyncio.run(scenario()).runs) == ["chat dua", "chat satu"]
+
+
+def test_handler_error_reaches_every_waiter():
+    async def failing(key, text, placeholder, message, count):
+        raise RuntimeError("agent down")
+
+    async def scenario():
+        coalescer = MessageCoalescer(failing, window=0.01)
+        return await asyncio.gather(
+            coalescer.submit(1, "a", None, placeholder("p")),
+            coalescer.submit(1, "b", None, placeholder("p")),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+def test_debounce_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("TELEGRAM_DEBOUNCE_SECONDS", raising=False)
+    assert not MessageCoalescer(Recorder().handler).enabled
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.agents import Tool
+from langchain.agents.agent import BaseSingleActionAgent
+from langchain.schema import AgentAction
+
+from utils.deadline import (
+    DeadlineAgentExecutor,
+    PARTIAL_ANSWER,
+    TIMEOUT_ANSWER,
+    deadline_scope,
+    partial_answer,
+)
+
+RAW_ROWS = "[(101, 'Kamar A', 1500000, 'kosong')]"
+
+
+class LoopingAgent(BaseSingleActionAgent):
+    """Agent yang tidak pernah selesai sendiri: selalu memanggil tool lagi"""
+
+    @property
+    def input_keys(self):
+        return ["input"]
+
+    def plan(self, intermediate_steps, callbacks=None, **kwargs):
+        return AgentAction(tool="cek_kamar", tool_input="kamar", log="")
+
+    async def aplan(self, intermediate_steps, callbacks=None, **kwargs):
+        return self.plan(intermediate_steps)
+
+
+def make_executor(calls):
+    def cek_kamar(_):
+        calls.append(1)
+        time.sleep(0.05)
+        return RAW_ROWS
+
+    return DeadlineAgentExecutor(
+        agent=LoopingAgent(),
+        tools=[Tool(name="cek_kamar", func=cek_kamar, description="Cek kamar")],
+        max_iterations=20,
+        step_reserve=0.1,
+    )
+
+
+def test_executor_stops_before_the_deadline():
+    calls = []
+    started = time.monotonic()
+    with deadline_scope(0.3):
+        result = make_executor(calls).invoke({"input": "kamar kosong?"})
+
+    assert len(calls) < 20
+    assert time.monotonic() - started < 0.3
+    # Raw tool output never reaches the user
+    assert result["output"] == PARTIAL_ANSWER
+    assert RAW_ROWS not in result["output"]
+
+
+def test_executor_without_deadline_runs_to_the_iteration_limit():
+    calls = []
+    result = make_executor(calls).invoke({"input": "kamar kosong?"})
+    assert len(calls) == 20
+    assert result["output"].startswith("Agent stopped")
+
+
+def test_partial_answer_without_tool_results():
+    assert partial_answer([]) == TIMEOUT_ANSWER
+    assert partial_answer([(None, "")]) == TIMEOUT_ANSWER
+    assert partial_answer([(None, RAW_ROWS)]) == PARTIAL_ANSWER
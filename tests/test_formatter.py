@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("requests")
+
+from utils.zeroshot_formatter import ZeroShotTextFormatter
+
+
+@pytest.fixture
+def formatter():
+    return ZeroShotTextFormatter(use_llm=False)
+
+
+@pytest.mark.parametrize("text", [
+    "Kamar nomor 3. Sudah terisi.",
+    "Check-in tanggal 17.08.2025 jam 14.00. Harga Rp1.500.000. Terima kasih.",
+    "Kamar 2. Lantai 1. Kamar mandi dalam.",
+])
+def test_numbers_in_sentences_stay_inline(formatter, text):
+    assert formatter.format_text(text) == text
+
+
+def test_lone_room_number_before_next_sentence(formatter):
+    formatted = formatter.format_text("Ada kamar 5 dan kamar 7. Silakan pilih ya.")
+    assert "kamar 7." in formatted
+    assert "\n7." not in formatted
+
+
+def test_enumeration_is_split_into_lines(formatter):
+    formatted = formatter.format_text(
+        "Kamar yang tersedia: 1. Kamar A harga Rp1.500.000 2. Kamar B harga Rp2.000.000 3. Kamar C")
+    assert formatted == (
+        "Kamar yang tersedia:\n1. Kamar A harga Rp1.500.000\n2. Kamar B harga Rp2.000.000\n3. Kamar C")
+
+
+def test_comma_separated_enumeration(formatter):
+    assert formatter.format_text("Berikut pilihannya. 1. Kamar 3, 2. Kamar 5") == (
+        "Berikut pilihannya.\n1. Kamar 3\n2. Kamar 5")
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("langchain")
+tiktoken = pytest.importorskip("tiktoken")
+
+from utils.history import HistoryManager, CHARS_PER_TOKEN
+from utils.session_store import SessionStore
+
+
+def test_encoding_is_not_loaded_on_construction(monkeypatch):
+    def offline(*args, **kwargs):
+        raise AssertionError("encoding loaded at construction")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    HistoryManager()
+
+
+def test_falls_back_to_character_estimate_offline(monkeypatch):
+    def offline(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    monkeypatch.setattr(tiktoken, "encoding_for_model", offline)
+    manager = HistoryManager()
+    assert manager.count_tokens("x" * (CHARS_PER_TOKEN * 10)) == 10
+    assert manager.count_tokens("x") == 1
+
+
+def test_summary_lost_race_uses_the_stored_one():
+    store = SessionStore(max_messages=2)
+    store.append("42", "main", "m1", "m2", "m3", "m4")
+    manager = HistoryManager(store=store)
+
+    def summarize(previous, messages):
+        # A concurrent request for the same chat finishes its summary first
+        _, overflow = store.get_summary_state("42", "main")
+        store.set_summary("42", "main", "ringkasan lain", consumed=overflow)
+        store.append("42", "main", "m5")
+        return "ringkasan ini"
+
+    manager._summarize = summarize
+    history = manager.get_history("42", "main")
+
+    assert "ringkasan lain" in history[0].content
+    assert history[1:] == ["m4", "m5"]
+    # m3 was trimmed after the winner's summary: it is still waiting for the next one
+    assert store.get_summary_state("42", "main") == ("ringkasan lain", ["m3"])
@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("openai")
+
+from utils.llm_gateway import LLMGateway
+
+
+def test_nested_call_does_not_take_a_second_slot():
+    gateway = LLMGateway()
+    gateway.max_concurrency = 1
+
+    # With one slot, a nested call that acquired again would block forever
+    result = []
+    worker = threading.Thread(daemon=True, target=lambda: result.append(
+        gateway.call("text-embedding-ada-002", lambda: gateway.call("text-embedding-ada-002", lambda: "ok"))))
+    worker.start()
+    worker.join(timeout=5)
+    assert result == ["ok"]
+    assert gateway.stats()["text-embedding-ada-002"]["calls"] == 1
+
+
+def test_concurrent_calls_share_the_limit():
+    gateway = LLMGateway()
+    gateway.max_concurrency = 2
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(gateway.call("gpt-4.1-mini", lambda: "ok")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert results == ["ok"] * 8
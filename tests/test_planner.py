@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("openai")
+
+from agents.planner import QueryPlanner
+from agents.router import IntentRouter, DATABASE_AGENT, DOCUMENT_AGENT
+
+
+def test_compound_question_fans_out():
+    planner = QueryPlanner(IntentRouter())
+    plan = planner.plan("kamar mana yang masih kosong? dan apa peraturan jam malam")
+    assert plan is not None
+    assert {agent for agent, _ in plan} == {DATABASE_AGENT, DOCUMENT_AGENT}
+
+
+def test_planning_does_not_inflate_router_stats():
+    router = IntentRouter()
+    planner = QueryPlanner(router)
+    planner.plan("kamar mana yang masih kosong? dan apa peraturan jam malam")
+    # Each part is classified, but none of them is a request of its own
+    assert router.stats()["routed"] == 0
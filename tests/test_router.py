@@ -0,0 +1,33 @@
+from agents.router import IntentRouter, TRANSACTION_AGENT, DATABASE_AGENT
+
+
+def test_payment_query_is_not_fast_pathed():
+    router = IntentRouter()
+    decision = router.route("mau bayar sewa kamar 2")
+    assert decision.agent == TRANSACTION_AGENT
+    # The room price has to come from DatabaseAgent first
+    assert not router.is_confident(decision)
+
+
+def test_availability_query_is_fast_pathed():
+    router = IntentRouter()
+    decision = router.route("kamar kosong masih tersedia?")
+    assert decision.agent == DATABASE_AGENT
+    assert router.is_confident(decision)
+
+
+def test_uncounted_routes_stay_out_of_stats():
+    router = IntentRouter()
+    router.route("kamar kosong masih tersedia?")
+    router.route("peraturan jam malam", count=False)
+    assert router.stats()["routed"] == 1
+
+
+def test_hit_rate_counts_recorded_requests_only():
+    router = IntentRouter()
+    router.record(True, 0.5)
+    router.record(False, 2.0)
+    stats = router.stats()
+    assert stats["fast_path"] == 1
+    assert stats["llm_fallback"] == 1
+    assert stats["hit_rate"] == 0.5
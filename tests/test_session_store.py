@@ -0,0 +1,39 @@
+from utils.session_store import SessionStore
+
+
+def overflowing_store():
+    store = SessionStore(max_messages=2)
+    store.append("42", "main", "m1", "m2", "m3", "m4")
+    return store
+
+
+def test_summary_consumes_overflow():
+    store = overflowing_store()
+    summary, overflow = store.get_summary_state("42", "main")
+    assert summary is None and overflow == ["m1", "m2"]
+
+    assert store.set_summary("42", "main", "ringkasan", consumed=overflow)
+    assert store.get_summary_state("42", "main") == ("ringkasan", [])
+    assert store.get_history("42", "main") == ["m3", "m4"]
+
+
+def test_concurrent_summary_does_not_drop_new_overflow():
+    store = overflowing_store()
+    _, first = store.get_summary_state("42", "main")
+    _, second = store.get_summary_state("42", "main")
+    # Trimmed while both summaries were being generated
+    store.append("42", "main", "m5", "m6")
+
+    assert store.set_summary("42", "main", "ringkasan 1", consumed=first)
+    assert not store.set_summary("42", "main", "ringkasan 2", consumed=second)
+    assert store.get_summary_state("42", "main") == ("ringkasan 1", ["m3", "m4"])
+
+
+def test_summary_after_clear_is_rejected():
+    store = overflowing_store()
+    _, overflow = store.get_summary_state("42", "main")
+    store.clear("42", "main")
+    store.append("42", "main", "n1", "n2", "n3")
+
+    assert not store.set_summary("42", "main", "ringkasan lama", consumed=overflow)
+    assert store.get_summary_state("42", "main") == (None, ["n1"])
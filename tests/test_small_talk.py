@@ -0,0 +1,21 @@
+import pytest
+
+from agents.small_talk import SmallTalkMatcher
+
+
+@pytest.fixture
+def matcher():
+    matcher = SmallTalkMatcher()
+    matcher.enabled = True
+    return matcher
+
+
+def test_greeting_and_thanks_are_answered(matcher):
+    assert matcher.match("halooo pak kos")[0] == "greeting"
+    assert matcher.match("makasih ya kak")[0] == "thanks"
+
+
+@pytest.mark.parametrize("reply", ["oke", "ok", "siap", "baik", "sip", "noted", "iya", "ya"])
+def test_short_confirmations_reach_the_agent(matcher, reply):
+    # Answers to "apakah ingin langsung melakukan pembayaran?" must not get a canned reply
+    assert matcher.match(reply) is None
@@ -0,0 +1,36 @@
+from agents.router import RouteDecision, DATABASE_AGENT, DOCUMENT_AGENT
+from agents.speculation import Speculator
+
+
+def make_speculation(agent_input="jam malam kos sampai jam berapa?, telegram_id = 42"):
+    speculator = Speculator()
+    speculation = speculator.start(RouteDecision(DOCUMENT_AGENT, 0.6, "centroid"), agent_input)
+    speculation.execute(lambda q: "Jam malam sampai pukul 22.00.")
+    return speculator, speculation
+
+
+def test_database_agent_is_not_speculated_by_default():
+    speculator = Speculator()
+    assert not speculator.should_speculate(RouteDecision(DATABASE_AGENT, 0.9, "centroid"))
+    assert speculator.should_speculate(RouteDecision(DOCUMENT_AGENT, 0.9, "centroid"))
+
+
+def test_claim_with_same_question():
+    speculator, speculation = make_speculation()
+    result = speculation.claim(DOCUMENT_AGENT, "jam malam kos sampai jam berapa")
+    assert result is not None
+    assert result.result() == "Jam malam sampai pukul 22.00."
+    assert speculator.stats()["used"] == 1
+
+
+def test_claim_with_different_question_is_dropped():
+    speculator, speculation = make_speculation()
+    assert speculation.claim(DOCUMENT_AGENT, "apa sanksi jika merokok di kamar?") is None
+    assert speculator.stats()["mismatched"] == 1
+    # Dropped for good: a later matching call runs the agent itself
+    assert speculation.claim(DOCUMENT_AGENT, "jam malam kos sampai jam berapa") is None
+
+
+def test_claim_with_different_number_is_dropped():
+    speculator, speculation = make_speculation("denda telat bayar 3 hari berapa?, telegram_id = 42")
+    assert speculation.claim(DOCUMENT_AGENT, "denda telat bayar 5 hari berapa?") is None
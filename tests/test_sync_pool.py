@@ -0,0 +1,47 @@
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("asyncpg")
+pytest.importorskip("requests")
+
+from benchmarks.e2e import FakePostgres, FakePsycopgConnection
+from database.sync_pool import SyncConnectionPool
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    pg = FakePostgres(0)
+    monkeypatch.setattr(psycopg2, "connect", lambda *args, **kwargs: FakePsycopgConnection(pg))
+    return pg
+
+
+def make_pool(max_size=2):
+    pool = SyncConnectionPool(dsn="postgresql://test")
+    pool.min_size, pool.max_size = 1, max_size
+    pool.acquire_timeout = 0.1
+    pool._slots.__init__(max_size)
+    return pool
+
+
+def test_fresh_connection_checkout(pg):
+    pool = make_pool()
+    # More checkouts than connections: nothing may leak
+    for _ in range(pool.max_size * 3):
+        conn = pool.getconn()
+        assert conn.autocommit
+        pool.putconn(conn)
+    assert pool.stats()["checkouts"] == pool.max_size * 3
+    pool.close()
+
+
+def test_failed_checkout_returns_connection(pg):
+    pool = make_pool(max_size=1)
+    pool._statement_timeout = lambda: 1 / 0
+    for _ in range(3):
+        with pytest.raises(ZeroDivisionError):
+            pool.getconn()
+    assert not pool._get_pool()._used
+    del pool._statement_timeout
+    # The slot came back too
+    pool.putconn(pool.getconn())
+    pool.close()
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from database.db_operator import users
+from database.db_operator.users import UsersRepository, user_id_cache
+
+
+class FakeConnection:
+    """Kembalikan baris dari `rows` berurutan dan catat setiap SQL yang dijalankan"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.calls = []
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append((sql, args))
+        return self.rows.pop(0)
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    def install(*rows):
+        fake = FakeConnection(rows)
+        monkeypatch.setattr(users, "DatabaseConnection", fake)
+        return fake
+    user_id_cache.invalidate()
+    yield install
+    user_id_cache.invalidate()
+
+
+def test_upsert_needs_no_unique_constraint(connection):
+    fake = connection({"user_id": 7})
+    user_id = asyncio.run(UsersRepository().insert_user(telegram_id="42"))
+
+    assert user_id == 7
+    sql, args = fake.calls[0]
+    # A conflict target would fail on a users table without a unique email constraint
+    assert "ON CONFLICT DO NOTHING" in sql
+    assert "ON CONFLICT (" not in sql
+    assert "OR telegram_id = $3" in sql
+    assert args == ("42@TELEGRAM", "42@telegram@gmail.com", "42")
+
+
+def test_lost_insert_race_is_retried(connection):
+    fake = connection(None, {"user_id": 9})
+    assert asyncio.run(UsersRepository().insert_user(email="budi@mail.com")) == 9
+    assert len(fake.calls) == 2
+
+
+def test_known_telegram_id_skips_the_database(connection):
+    fake = connection({"user_id": 5})
+    repository = UsersRepository()
+    asyncio.run(repository.insert_user(telegram_id="42"))
+    assert asyncio.run(repository.insert_user(telegram_id="42")) == 5
+    assert len(fake.calls) == 1
@@ -2,11 +2,23 @@ from langchain.tools import Tool
 from pydantic.v1 import BaseModel
 from typing import Optional
 import sqlite3
+import threading
 import pandas as pd
 from datetime import datetime
 
-# Database connection
-conn = sqlite3.connect("guest_rooms.db")
+# Database connection, opened on first use
+_conn = None
+_conn_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                # Tools run on agent worker threads, not the thread that opened the connection
+                _conn = sqlite3.connect("guest_rooms.db", check_same_thread=False)
+    return _conn
 
 
 def save_complaint(complaint_data: str):
@@ -20,6 +32,7 @@ def save_complaint(complaint_data: str):
 
         guest_name, room_id, description = parts
 
+        conn = _get_connection()
         c = conn.cursor()
         c.execute('''
             INSERT INTO complaints (guest_name, room_id, description, status, created_at)
@@ -38,6 +51,7 @@ def get_complaint_by_id(complaint_id_str: str):
     """Get complaint details by ID"""
     try:
         complaint_id = int(complaint_id_str.strip())
+        conn = _get_connection()
         c = conn.cursor()
         c.execute('''
             SELECT complaint_id, guest_name, room_id, description, status, created_at
@@ -65,6 +79,7 @@ def get_complaints_by_user(guest_name: str):
     """Get all complaints by guest name"""
     try:
         guest_name = guest_name.strip()
+        conn = _get_connection()
         c = conn.cursor()
         c.execute('''
             SELECT complaint_id, room_id, description, status, created_at
@@ -92,6 +107,7 @@ def get_complaints_by_user(guest_name: str):
 def get_all_complaints():
     """Get all complaints with pagination"""
     try:
+        conn = _get_connection()
         c = conn.cursor()
         c.execute('''
             SELECT complaint_id, guest_name, room_id, description, status, created_at
@@ -130,6 +146,7 @@ def update_complaint_status(status_data: str):
         complaint_id = int(parts[0].strip())
         status = parts[1].strip()
 
+        conn = _get_connection()
         c = conn.cursor()
         c.execute('''
             UPDATE complaints 
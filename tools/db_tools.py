@@ -1,62 +1,190 @@
 from langchain.tools import Tool
 from pydantic.v1 import BaseModel
-from typing import List
-import psycopg2
-from database.connection import DATABASE_URL
+from contextvars import ContextVar
+from typing import List, Optional, Sequence
+import csv
+import io
+import os
+import re
+import uuid
+from database.sync_pool import sync_pool
+from database.schema_catalog import schema_catalog
+from database.db_operator.users import user_id_cache
+from utils.answer_cache import answer_cache, ROOMS
+from utils.deadline import expired, record_hit
+from utils.metrics import TOOL
+
+WRITE_TABLE_PATTERN = re.compile(
+    r'\b(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|alter\s+table|drop\s+table)\s+(?:public\.)?"?(\w+)"?',
+    re.IGNORECASE
+)
+
+DDL_PATTERN = re.compile(
+    r'\b(?:create|alter|drop)\s+(?:(?:or\s+replace|temp|temporary|unlogged|unique)\s+)*'
+    r'(?:table|index|view|materialized\s+view|type|schema)\b|\bcomment\s+on\b',
+    re.IGNORECASE
+)
+
+READ_QUERY_PATTERN = re.compile(r'^\s*(?:select|with|table|values)\b', re.IGNORECASE)
+
+DEADLINE_ERROR = "Error running query: request deadline exceeded, query was not executed."
+READ_ONLY_ERROR = "Error running query: only SELECT queries are allowed right now, query was not executed."
+
+# Bounds on what one query may put into the agent prompt
+MAX_ROWS = int(os.getenv("DB_TOOLS_MAX_ROWS", 50))
+MAX_CELL_CHARS = int(os.getenv("DB_TOOLS_MAX_CELL_CHARS", 200))
+MAX_OUTPUT_CHARS = int(os.getenv("DB_TOOLS_MAX_OUTPUT_CHARS", 6000))
+# Rows beyond the cap are counted server-side up to this many
+COUNT_CAP = int(os.getenv("DB_TOOLS_COUNT_CAP", 10000))
+
+class ReadOnlyScope:
+    """Penanda run yang tidak boleh menulis ke database (mis. run spekulatif)"""
 
-class DatabaseConnection:
     def __init__(self):
-        self.conn = psycopg2.connect(DATABASE_URL)
-        self.conn.autocommit = True
+        self.blocked_writes = 0
+
+
+# Set for runs whose result may be thrown away; run_pg_query then refuses writes
+current_read_only: ContextVar[Optional[ReadOnlyScope]] = ContextVar("current_read_only", default=None)
+
+
+class DatabaseConnection:
+    """Cursor di atas koneksi dari pool bersama db_tools"""
 
     def __enter__(self):
+        self.conn = sync_pool.getconn()
         self.cursor = self.conn.cursor()
         return self.cursor
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.cursor.close()
-        self.conn.close()
+        try:
+            self.cursor.close()
+        finally:
+            # run_pg_query turns errors into tool output, so exc_val is usually None here;
+            # putconn checks the connection itself and drops closed or non-idle ones
+            sync_pool.putconn(self.conn)
 
 def list_tables(show=None):
-    with DatabaseConnection() as cursor:
-        cursor.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema='public' AND table_type='BASE TABLE';
-        """)
-        rows = cursor.fetchall()
-        return "\n".join(row[0] for row in rows)
+    return "\n".join(schema_catalog.table_names())
 
 def describe_tables(table_names: List[str]):
     if not table_names:
         return "No tables provided."
+    return schema_catalog.describe(table_names)
+
+def written_tables(query: str) -> set:
+    """Nama tabel yang diubah oleh query (INSERT/UPDATE/DELETE/DDL)"""
+    return {table.lower() for table in WRITE_TABLE_PATTERN.findall(query)}
+
+
+def _invalidate_caches(query: str):
+    if DDL_PATTERN.search(query):
+        schema_catalog.invalidate()
+    tables = written_tables(query)
+    if "rooms" in tables:
+        answer_cache.invalidate(ROOMS)
+    if "users" in tables:
+        # Profile updates may change or remove a telegram_id -> user_id mapping
+        user_id_cache.invalidate()
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    if len(text) > MAX_CELL_CHARS:
+        return text[:MAX_CELL_CHARS] + "..."
+    return text
+
+
+def format_rows(columns: Sequence[str], rows: Sequence[tuple], more: int = 0, more_capped: bool = False) -> str:
+    """
+    Hasil query sebagai CSV dengan header, dibatasi MAX_OUTPUT_CHARS.
+
+    Baris yang tidak ditampilkan diringkas menjadi satu baris "N more rows".
+    """
+    if not rows:
+        return f"Query returned 0 rows. Columns: {', '.join(columns)}"
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    shown = 0
+    for row in rows:
+        line_start = buffer.tell()
+        writer.writerow([_cell(value) for value in row])
+        if shown and buffer.tell() > MAX_OUTPUT_CHARS:
+            buffer.seek(line_start)
+            buffer.truncate()
+            break
+        shown += 1
+
+    more += len(rows) - shown
+    output = buffer.getvalue()
+    if more:
+        count = f"more than {more}" if more_capped else str(more)
+        output += (
+            f"({count} more rows not shown; use WHERE, LIMIT or aggregates such as COUNT "
+            f"to get the rows you need)"
+        )
+    return output.rstrip("\n")
+
+
+def _is_read_query(query: str) -> bool:
+    return bool(READ_QUERY_PATTERN.match(query)) and not written_tables(query)
+
+
+def _run_read_query(conn, query: str, read_only: bool = False) -> str:
+    """
+    SELECT lewat server-side cursor: hanya MAX_ROWS baris yang dikirim ke
+    client, sisanya cuma dihitung (MOVE) di server.
+    """
+    # Named cursors only exist inside a transaction
+    conn.autocommit = False
+    try:
+        if read_only:
+            # Postgres itself rejects writes hidden in functions or CTEs
+            with conn.cursor() as guard:
+                guard.execute("SET TRANSACTION READ ONLY")
+        with conn.cursor(name=f"run_pg_query_{uuid.uuid4().hex[:12]}") as cursor:
+            cursor.itersize = MAX_ROWS
+            cursor.execute(query)
+            rows = cursor.fetchmany(MAX_ROWS)
+            columns = [column.name for column in cursor.description] if cursor.description else []
+            more = 0
+            if len(rows) == MAX_ROWS:
+                with conn.cursor() as counter:
+                    counter.execute(f'MOVE FORWARD {COUNT_CAP} IN "{cursor.name}"')
+                    more = max(counter.rowcount, 0)
+        return format_rows(columns, rows, more, more_capped=more >= COUNT_CAP)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
 
-    descriptions = []
-    with DatabaseConnection() as cursor:
-        for table in table_names:
-            cursor.execute("""
-                SELECT column_name, data_type, is_nullable, column_default
-                FROM information_schema.columns
-                WHERE table_schema = 'public' AND table_name = %s;
-            """, (table,))
-            rows = cursor.fetchall()
-            schema = f"Table: {table}\n"
-            for row in rows:
-                column_name, data_type, is_nullable, column_default = row
-                schema += f"  {column_name}: {data_type}, Nullable: {is_nullable}, Default: {column_default}\n"
-            descriptions.append(schema)
-    return "\n\n".join(descriptions)
 
 def run_pg_query(query: str):
+    if expired():
+        record_hit(TOOL)
+        return DEADLINE_ERROR
+    read_only = current_read_only.get()
+    is_read = _is_read_query(query)
+    if read_only is not None and not is_read:
+        read_only.blocked_writes += 1
+        return READ_ONLY_ERROR
     with DatabaseConnection() as cursor:
         try:
+            if is_read:
+                return _run_read_query(cursor.connection, query, read_only=read_only is not None)
+
             cursor.execute(query)
-            try:
-                rows = cursor.fetchall()
-                return rows if rows else "Query executed successfully."
-            except psycopg2.ProgrammingError:
-                # No results to fetch (e.g., INSERT/UPDATE)
+            _invalidate_caches(query)
+            if cursor.description is None:
+                # No results to fetch (e.g., INSERT/UPDATE without RETURNING)
                 return "Query executed successfully."
+            rows = cursor.fetchmany(MAX_ROWS + 1)
+            columns = [column.name for column in cursor.description]
+            more = max(cursor.rowcount - MAX_ROWS, 0) if len(rows) > MAX_ROWS else 0
+            return format_rows(columns, rows[:MAX_ROWS], more)
         except Exception as e:
             return f"Error running query: {str(e)}"
 
@@ -86,13 +214,20 @@ db_tools = [
     ),
     Tool.from_function(
         name="describe_tables",
-        description="Berikan daftar nama tabel, kembalikan definisi skema SQL dari tabel-tabel tersebut.",
+        description=(
+            "Berikan daftar nama tabel, kembalikan definisi skema SQL dari tabel-tabel tersebut "
+            "(kolom, primary key, foreign key, dan index)."
+        ),
         func=describe_tables,
         args_schema=DescribeTablesArgsSchema
     ),
     Tool.from_function(
         name="run_pg_query",
-        description="Jalankan query SQL biasa untuk mendapatkan data dari database.",
+        description=(
+            "Jalankan query SQL biasa untuk mendapatkan data dari database. "
+            f"Hasil berupa CSV dengan header, maksimal {MAX_ROWS} baris; gunakan WHERE, LIMIT, "
+            "atau agregasi (COUNT, SUM) untuk tabel besar."
+        ),
         func=run_pg_query,
         args_schema=RunQueryArgsSchema
     )
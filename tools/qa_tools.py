@@ -1,11 +1,10 @@
 from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.chains import RetrievalQA
-from langchain.chat_models import ChatOpenAI
 from langchain.tools import Tool
 from langchain.schema import Document
 from typing import List
 from utils.logger import logger
+from utils.llm_gateway import get_chat_model, get_embeddings
 
 
 class DocumentQATool:
@@ -32,7 +31,7 @@ class DocumentQATool:
             logger.info(f"Initializing Document Q&A components with directory: {self.persist_dir} ...")
 
             # Initialize embeddings
-            self.embeddings = OpenAIEmbeddings()
+            self.embeddings = get_embeddings()
             logger.info("Init embedding OpenAI success.")
 
             # Initialize vector database
@@ -49,8 +48,8 @@ class DocumentQATool:
 
             # Initialize QA chain with custom prompt
             self.qa_chain = RetrievalQA.from_chain_type(
-                llm=ChatOpenAI(
-                    model=self.model,
+                llm=get_chat_model(
+                    self.model,
                     temperature=0.1,  # Low temperature for consistent responses
                 ),
                 retriever=retriever,
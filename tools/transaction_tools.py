@@ -1,8 +1,14 @@
 from langchain.tools import StructuredTool
 from midtrans.client import create_payment_link
+from utils.deadline import expired, record_hit
+from utils.metrics import TOOL
 
 def send_payment_link(booking_id: str, room_price: float) -> str:
     print("Menuju ke link pembayaran/transaksi")
+    if expired():
+        # Too late to create a Midtrans transaction the user will never see
+        record_hit(TOOL)
+        return "Link pembayaran belum bisa dibuat karena waktu pemrosesan habis. Silakan coba lagi."
     payment_link = create_payment_link(booking_id=booking_id, price=room_price)
     return f"Silakan klik link berikut untuk melakukan pembayaran: {payment_link}"
 
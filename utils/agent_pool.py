@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from utils.logger import logger
+
+
+class AgentWorkerPool:
+    """
+    Worker pool terbatas untuk menjalankan agent chain yang blocking
+    (LangChain, psycopg2, sqlite, gspread) di luar event loop.
+
+    Mode eksekusi (env AGENT_EXECUTION_MODE):
+    - "pool"   : jalankan di thread pool dengan batas konkurensi (default)
+    - "inline" : jalankan langsung di event loop (perilaku lama, untuk debugging)
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        mode: Optional[str] = None
+    ):
+        self.mode = (mode or os.getenv("AGENT_EXECUTION_MODE", "pool")).lower()
+        self.max_workers = max_workers or int(os.getenv("AGENT_MAX_WORKERS", 8))
+        self.max_concurrency = min(
+            max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", self.max_workers)),
+            self.max_workers
+        )
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="agent-worker"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # Metrics
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._max_queue_depth = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+        logger.info(
+            f"Agent worker pool ready: mode={self.mode}, workers={self.max_workers}, "
+            f"concurrency={self.max_concurrency}")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Jalankan fungsi blocking di worker pool dan tunggu hasilnya.
+
+        Context variables milik caller ikut dibawa ke worker thread.
+        """
+        if self.mode == "inline":
+            return func(*args, **kwargs)
+
+        enqueued_at = time.perf_counter()
+        self._on_enqueue()
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            self._on_dequeue()
+            raise
+
+        started_at = time.perf_counter()
+        self._on_start(started_at - enqueued_at)
+
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor,
+            functools.partial(ctx.run, func, *args, **kwargs)
+        )
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # A running thread cannot be interrupted: the slot stays taken until it is done
+            self._on_cancel()
+            future.add_done_callback(lambda done: self._release_abandoned(done, started_at))
+            raise
+        except Exception:
+            self._release(started_at, failed=True)
+            raise
+        self._release(started_at, failed=False)
+        return result
+
+    def _release(self, started_at: float, failed: bool):
+        self._semaphore.release()
+        self._on_finish(time.perf_counter() - started_at, failed=failed)
+
+    def _release_abandoned(self, future: "asyncio.Future", started_at: float):
+        # Retrieve the outcome nobody awaits any more so asyncio does not log it
+        if not future.cancelled():
+            future.exception()
+        self._release(started_at, failed=True)
+
+    def _on_enqueue(self):
+        with self._lock:
+            self._queued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+
+    def _on_dequeue(self):
+        with self._lock:
+            self._queued -= 1
+
+    def _on_start(self, wait: float):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+            self._total_wait += wait
+
+    def _on_cancel(self):
+        with self._lock:
+            self._cancelled += 1
+
+    def _on_finish(self, duration: float, failed: bool):
+        with self._lock:
+            self._in_flight -= 1
+            self._total_run += duration
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def has_idle_workers(self, count: int = 1) -> bool:
+        """True jika `count` run baru bisa langsung jalan tanpa antri"""
+        if self.mode == "inline":
+            return False
+        with self._lock:
+            return self._queued == 0 and self._in_flight + count <= self.max_concurrency
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot metrik antrian dan eksekusi worker pool"""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": self._queued,
+                "max_queue_depth": self._max_queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "avg_wait_ms": round(self._total_wait / finished * 1000, 2) if finished else 0.0,
+                "avg_run_ms": round(self._total_run / finished * 1000, 2) if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = False):
+        """Hentikan worker pool"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Agent worker pool shut down")
@@ -0,0 +1,183 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils.logger import logger
+
+# Data sources a cached answer can depend on
+DOCUMENTS = "documents"
+ROOMS = "rooms"
+
+# The word after these names a specific kost, room, date, ... ("kos melati", "kamar tiga")
+ENTITY_MARKERS = {
+    "kamar", "kos", "kost", "nomor", "no", "room", "tipe", "lantai", "tanggal", "bulan", "blok", "unit",
+}
+
+# "kamar yang kosong" and "kamar yang tidak kosong" differ by one token but ask the opposite
+NEGATION_WORDS = {
+    "tidak", "tak", "bukan", "belum", "jangan", "gak", "ga", "nggak", "ngga", "enggak", "tanpa", "non",
+}
+
+# Whole words that make a question about the asking user's own data
+PERSONAL_WORDS = {
+    "saya", "aku", "gue", "gw", "ku", "kamarku", "pesananku", "bookingku", "tagihanku",
+    "pesanan", "pesan", "booking", "bookingan", "update",
+}
+
+
+class _CacheEntry:
+    def __init__(self, answer: str, tokens: Counter, entities: Set[str], tags: Set[str]):
+        self.answer = answer
+        self.tokens = tokens
+        self.entities = entities
+        self.tags = tags
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """
+    Cache jawaban untuk pertanyaan yang berulang (tombol inline, FAQ).
+
+    Query dinormalisasi lalu dicocokkan secara exact atau dengan cosine
+    similarity token di atas threshold, asalkan entity-nya (angka, nama
+    kamar/kos, kata negasi) persis sama: "kamar 2" tidak pernah menjawab
+    "kamar 3", dan "kosong" tidak menjawab "tidak kosong". Setiap entry diberi tag sumber data
+    (DOCUMENTS, ROOMS) sehingga bisa di-invalidate saat data berubah.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.enabled = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+        self.threshold = threshold or float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.85))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 600))
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._invalidations: Counter = Counter()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Lowercase, hapus tanda baca, dan rapikan spasi"""
+        text = re.sub(r"[^\w\s]", " ", query.lower())
+        return re.sub(r"\s+", " ", text).strip()
+
+    @staticmethod
+    def entities(words: List[str]) -> Set[str]:
+        """Token yang menentukan jawaban: angka, kata negasi, dan kata setelah ENTITY_MARKERS"""
+        found = {word for word in words if word in NEGATION_WORDS or any(char.isdigit() for char in word)}
+        for marker, word in zip(words, words[1:]):
+            if marker in ENTITY_MARKERS:
+                found.add(word)
+        return found
+
+    @classmethod
+    def is_personal(cls, query: str) -> bool:
+        """True jika pertanyaan menyangkut data user sendiri (pesanan, profil); tidak boleh dibagi"""
+        return bool(PERSONAL_WORDS.intersection(cls.normalize(query).split()))
+
+    @staticmethod
+    def _similarity(a: Counter, b: Counter) -> float:
+        dot = sum(count * b.get(token, 0) for token, count in a.items())
+        if not dot:
+            return 0.0
+        norm_a = math.sqrt(sum(c * c for c in a.values()))
+        norm_b = math.sqrt(sum(c * c for c in b.values()))
+        return dot / (norm_a * norm_b)
+
+    def _is_expired(self, entry: _CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at >= self.ttl_seconds
+
+    def get(self, query: str) -> Optional[str]:
+        """Jawaban cache untuk query, atau None jika tidak ada yang cukup mirip"""
+        if not self.enabled or not query:
+            return None
+
+        key = self.normalize(query)
+        words = key.split()
+        tokens = Counter(words)
+        entities = self.entities(words)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._is_expired(entry):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry.answer
+
+            best_key, best_score = None, 0.0
+            for entry_key, candidate in list(self._entries.items()):
+                if self._is_expired(candidate):
+                    del self._entries[entry_key]
+                    continue
+                # Same wording, different room or number: a different question
+                if candidate.entities != entities:
+                    continue
+                score = self._similarity(tokens, candidate.tokens)
+                if score > best_score:
+                    best_key, best_score = entry_key, score
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self._hits += 1
+                self._similar_hits += 1
+                return self._entries[best_key].answer
+
+            self._misses += 1
+            return None
+
+    def put(self, query: str, answer: str, tags: Iterable[str]):
+        """Simpan jawaban beserta tag sumber data yang menjadi dependensinya"""
+        if not self.enabled or not query or not answer:
+            return
+
+        key = self.normalize(query)
+        with self._lock:
+            words = key.split()
+            self._entries[key] = _CacheEntry(answer, Counter(words), self.entities(words), set(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tag: Optional[str] = None) -> int:
+        """Hapus entry dengan tag tertentu, atau semua entry jika tag kosong"""
+        with self._lock:
+            if tag is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key, entry in self._entries.items() if tag in entry.tags]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self._invalidations[tag or "all"] += 1
+
+        if removed:
+            logger.info(f"Answer cache invalidated {removed} entries (tag={tag or 'all'})")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "similar_hits": self._similar_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "invalidations": dict(self._invalidations),
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.agents import AgentExecutor
+
+from utils.logger import logger
+from utils.metrics import SUB_AGENT
+
+# Absolute time.monotonic() by which the current request must be answered
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+STOPPED_OUTPUT_PREFIX = "Agent stopped"
+TIMEOUT_ANSWER = (
+    "Maaf, permintaan Anda membutuhkan waktu terlalu lama untuk diproses. "
+    "Silakan coba lagi atau perjelas pertanyaan Anda ya."
+)
+PARTIAL_ANSWER = (
+    "Maaf, permintaan Anda masih diproses dan belum selesai tepat waktu. "
+    "Silakan tanyakan lagi sebentar lagi ya."
+)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class _DeadlineStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits: Dict[str, int] = {}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_hit(self, stage: str):
+        with self._lock:
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_seconds": request_budget(),
+                "requests": self.requests,
+                "hits_by_stage": dict(self.hits),
+            }
+
+
+deadline_stats = _DeadlineStats()
+
+
+def request_budget() -> float:
+    return float(os.getenv("REQUEST_DEADLINE_SECONDS", 45))
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None):
+    """
+    Pasang deadline untuk request yang sedang berjalan. Deadline yang sudah
+    ada tidak pernah diperpanjang.
+    """
+    budget = seconds if seconds is not None else request_budget()
+    deadline = time.monotonic() + budget
+    outer = current_deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    else:
+        deadline_stats.record_request()
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Sisa waktu (detik) untuk request aktif, atau None jika tidak ada deadline"""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired(reserve: float = 0.0) -> bool:
+    """True jika sisa waktu kurang dari `reserve` detik"""
+    left = remaining()
+    return left is not None and left <= reserve
+
+
+def check(stage: str, reserve: float = 0.0):
+    """Raise DeadlineExceeded (dan catat hit untuk stage) jika waktu sudah habis"""
+    if expired(reserve):
+        record_hit(stage)
+        raise DeadlineExceeded(stage)
+
+
+def record_hit(stage: str):
+    deadline_stats.record_hit(stage)
+    logger.warning(f"Request deadline hit during {stage}")
+
+
+def timeout_for(default: float) -> float:
+    """Timeout untuk panggilan I/O: default, dipersingkat sampai sisa waktu request"""
+    left = remaining()
+    if left is None:
+        return default
+    return max(0.1, min(default, left))
+
+
+def partial_answer(intermediate_steps: List[Tuple[Any, Any]]) -> str:
+    """
+    Jawaban untuk agent yang dihentikan deadline. Hasil tool mentah (baris
+    SQL, potongan dokumen) tidak pernah dikirim ke user; hanya pesan tetap.
+    """
+    if not any(observation for _, observation in intermediate_steps):
+        return TIMEOUT_ANSWER
+    return PARTIAL_ANSWER
+
+
+class DeadlineAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor yang berhenti mengambil langkah baru ketika sisa waktu
+    request kurang dari `step_reserve` detik (cukup untuk satu langkah LLM),
+    lalu mengembalikan pesan tetap dari `partial_answer`.
+    """
+
+    step_reserve: float = float(os.getenv("DEADLINE_STEP_RESERVE_SECONDS", 5))
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if iterations > 0 and expired(self.step_reserve):
+            record_hit(SUB_AGENT)
+            return False
+        return super()._should_continue(iterations, time_elapsed)
+
+    def _return(self, output: Any, intermediate_steps: list, run_manager: Any = None) -> Dict[str, Any]:
+        stopped = str(output.return_values.get("output", "")).startswith(STOPPED_OUTPUT_PREFIX)
+        if stopped and expired(self.step_reserve):
+            output.return_values["output"] = partial_answer(intermediate_steps)
+        return super()._return(output, intermediate_steps, run_manager=run_manager)
@@ -0,0 +1,146 @@
+import os
+import threading
+from typing import Any, List, Optional
+
+import tiktoken
+from langchain.schema import SystemMessage
+
+from utils.llm_gateway import get_chat_model
+from utils.logger import logger
+from utils.session_store import SessionStore, session_store
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+# Rough token size used when no tiktoken encoding can be loaded (offline, cold cache)
+CHARS_PER_TOKEN = 4
+
+
+class HistoryManager:
+    """
+    Riwayat percakapan dengan budget token untuk prompt setiap agent.
+
+    Pesan terbaru dipertahankan selama total tokennya (dihitung dengan
+    tiktoken) masih di bawah HISTORY_TOKEN_BUDGET. Pesan yang lebih lama
+    digabung ke ringkasan yang di-cache per session, dan ringkasan hanya
+    dihitung ulang ketika ada pesan baru yang keluar dari window.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore = session_store,
+        max_tokens: Optional[int] = None,
+        summary_model: Optional[str] = None,
+        max_summary_tokens: Optional[int] = None
+    ):
+        self.store = store
+        self.max_tokens = max_tokens or int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+        self.summary_model = summary_model or os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4.1-mini")
+        self.max_summary_tokens = max_summary_tokens or int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 300))
+
+        # Loaded on first use: tiktoken may have to download the encoding
+        self._encoding = None
+        self._encoding_loaded = False
+        self._llm = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_encoding(model: str):
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Newer model names are not always known to the installed tiktoken
+            try:
+                return tiktoken.get_encoding("o200k_base")
+            except ValueError:
+                return tiktoken.get_encoding("cl100k_base")
+
+    def _get_encoding(self):
+        """Encoding tiktoken, atau None jika tidak bisa dimuat (pakai estimasi karakter)"""
+        if not self._encoding_loaded:
+            with self._lock:
+                if not self._encoding_loaded:
+                    try:
+                        self._encoding = self._load_encoding(self.summary_model)
+                    except Exception as e:
+                        logger.warning(f"tiktoken encoding unavailable, estimating tokens from characters: {e}")
+                    self._encoding_loaded = True
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode(text))
+
+    def count_message_tokens(self, message: Any) -> int:
+        content = getattr(message, "content", message)
+        return self.count_tokens(str(content)) + MESSAGE_TOKEN_OVERHEAD
+
+    def append(self, session_id: str, namespace: str, *messages: Any):
+        """Tambahkan pesan; pesan lama yang melewati budget dipindah ke overflow"""
+        self.store.append(
+            session_id,
+            namespace,
+            *messages,
+            token_counter=self.count_message_tokens,
+            max_tokens=self.max_tokens
+        )
+
+    def get_history(self, session_id: str, namespace: str) -> List[Any]:
+        """
+        Riwayat untuk prompt: ringkasan percakapan lama (jika ada) diikuti
+        pesan-pesan terbaru yang muat dalam budget.
+        """
+        summary, overflow = self.store.get_summary_state(session_id, namespace)
+        if overflow:
+            updated = self._summarize(summary, overflow)
+            if self.store.set_summary(session_id, namespace, updated, consumed=overflow):
+                summary = updated
+            else:
+                # Another request stored its summary first (or the history was cleared); use that
+                summary, _ = self.store.get_summary_state(session_id, namespace)
+
+        history = self.store.get_history(session_id, namespace)
+        if summary:
+            return [SystemMessage(content=f"Ringkasan percakapan sebelumnya:\n{summary}")] + history
+        return history
+
+    def clear(self, session_id: str, namespace: str):
+        self.store.clear(session_id, namespace)
+
+    def _get_llm(self):
+        with self._lock:
+            if self._llm is None:
+                self._llm = get_chat_model(
+                    self.summary_model,
+                    temperature=0,
+                    max_tokens=self.max_summary_tokens
+                )
+            return self._llm
+
+    def _summarize(self, previous: Optional[str], messages: List[Any]) -> str:
+        """Gabungkan pesan yang keluar dari window ke ringkasan sebelumnya"""
+        transcript = "\n".join(
+            f"{getattr(m, 'type', 'message')}: {getattr(m, 'content', m)}" for m in messages)
+        prompt = (
+            "Perbarui ringkasan percakapan antara penghuni kos dan asisten berikut. "
+            "Pertahankan fakta penting (nama, nomor kamar, tanggal, pesanan, keluhan, pembayaran) "
+            "dan tulis dalam bahasa Indonesia secara singkat.\n\n"
+            f"Ringkasan sebelumnya:\n{previous or '-'}\n\n"
+            f"Percakapan baru:\n{transcript}\n\n"
+            "Ringkasan terbaru:"
+        )
+        try:
+            return self._get_llm().predict(prompt).strip()
+        except Exception as e:
+            logger.error(f"Error summarizing chat history: {e}")
+            # Keep the most recent part of the transcript within the summary budget
+            fallback = f"{previous or ''}\n{transcript}".strip()
+            encoding = self._get_encoding()
+            if encoding is None:
+                return fallback[-self.max_summary_tokens * CHARS_PER_TOKEN:]
+            tokens = encoding.encode(fallback)
+            return encoding.decode(tokens[-self.max_summary_tokens:])
+
+
+history_manager = HistoryManager()
@@ -0,0 +1,318 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import openai
+import requests
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
+from requests.adapters import HTTPAdapter
+
+from utils.llm_replay import llm_replay
+from utils.logger import logger
+from utils.streaming import streaming_llm_kwargs
+
+RETRYABLE_ERROR_NAMES = (
+    "RateLimitError",
+    "APIError",
+    "Timeout",
+    "APITimeoutError",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+)
+
+
+def _openai_error(name: str) -> Optional[type]:
+    # openai<1 keeps its exceptions in openai.error, openai>=1 at the top level
+    module = getattr(openai, "error", openai)
+    return getattr(module, name, None)
+
+
+RETRYABLE_ERRORS = tuple(
+    error for error in (_openai_error(name) for name in RETRYABLE_ERROR_NAMES) if error)
+RATE_LIMIT_ERROR = _openai_error("RateLimitError")
+
+
+def _parse_rate_limits(raw: str) -> Dict[str, float]:
+    """Parse "gpt-4.1=300,gpt-4.1-mini=1000" (requests per minute)"""
+    limits = {}
+    for item in raw.split(","):
+        if "=" in item:
+            model, rpm = item.split("=", 1)
+            limits[model.strip()] = float(rpm)
+    return limits
+
+
+class TokenBucket:
+    """Rate limiter token bucket yang dipakai bersama oleh semua thread"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self) -> float:
+        """Ambil satu token, tunggu jika perlu. Mengembalikan lama menunggu (detik)."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds: float):
+        """Kosongkan bucket agar semua caller ikut menunggu setelah 429"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+class _ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.throttle_wait = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+            "throttle_wait_ms": round(self.throttle_wait * 1000, 2),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+class LLMGateway:
+    """
+    Satu pintu untuk semua request OpenAI (chat dan embeddings).
+
+    - Koneksi HTTP dipakai bersama lewat satu requests.Session dengan pool
+    - Rate limit token bucket dan batas konkurensi per model
+    - Retry dengan jittered exponential backoff; 429 menahan seluruh bucket
+      model tersebut sehingga retry tidak menumpuk
+    - Counter latency dan token per model
+    """
+
+    def __init__(self):
+        self.default_rpm = float(os.getenv("LLM_DEFAULT_RPM", 500))
+        self.rate_limits = _parse_rate_limits(os.getenv("LLM_RATE_LIMITS", ""))
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY_PER_MODEL", 8))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 4))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+        self.backoff_max = float(os.getenv("LLM_BACKOFF_MAX", 20))
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats: Dict[str, _ModelStats] = {}
+        # Models whose slot the current thread holds inside call()
+        self._local = threading.local()
+
+        self._install_http_session(int(os.getenv("LLM_HTTP_POOL_SIZE", 32)))
+
+    def _install_http_session(self, pool_size: int):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # openai<1 reuses this session for every request instead of one per thread
+        openai.requestssession = session
+        self.http_session = session
+
+    def _model_state(self, model: str):
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = TokenBucket(self.rate_limits.get(model, self.default_rpm))
+                self._semaphores[model] = threading.BoundedSemaphore(self.max_concurrency)
+                self._stats[model] = _ModelStats()
+            return self._buckets[model], self._semaphores[model], self._stats[model]
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        headers = getattr(error, "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        # Full jitter keeps concurrent retries from firing in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def call(self, model: str, request: Callable[[], Any], stream: bool = False) -> Any:
+        """Jalankan request ke OpenAI lewat rate limiter dan retry gateway"""
+        active = getattr(self._local, "models", None)
+        if active is None:
+            active = self._local.models = set()
+        if model in active:
+            # Nested call (a wrapped client method delegating to another wrapped one):
+            # the outer call already holds the slot, the rate-limit token and the retries.
+            # Acquiring again would deadlock once every slot is held by an outer call.
+            return request()
+
+        bucket, semaphore, stats = self._model_state(model)
+
+        semaphore.acquire()
+        active.add(model)
+        started = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                waited = bucket.acquire()
+                with self._lock:
+                    stats.throttle_wait += waited
+                try:
+                    response = request()
+                    break
+                except RETRYABLE_ERRORS as e:
+                    is_rate_limit = RATE_LIMIT_ERROR is not None and isinstance(e, RATE_LIMIT_ERROR)
+                    delay = self._backoff(attempt, e)
+                    with self._lock:
+                        stats.retries += 1
+                        if is_rate_limit:
+                            stats.rate_limited += 1
+                    if attempt >= self.max_retries:
+                        raise
+                    if is_rate_limit:
+                        bucket.penalize(delay)
+                    logger.warning(f"LLM request to {model} failed ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+        except Exception:
+            semaphore.release()
+            self._record(stats, time.perf_counter() - started, failed=True)
+            raise
+        finally:
+            active.discard(model)
+
+        if stream:
+            # Hold the concurrency slot until the stream is fully consumed
+            return self._wrap_stream(response, semaphore, stats, started)
+
+        semaphore.release()
+        self._record(stats, time.perf_counter() - started, usage=self._usage(response))
+        return response
+
+    def _wrap_stream(self, response: Any, semaphore, stats: _ModelStats, started: float) -> Iterator[Any]:
+        failed = False
+        try:
+            for chunk in response:
+                yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            semaphore.release()
+            self._record(stats, time.perf_counter() - started, failed=failed)
+
+    @staticmethod
+    def _usage(response: Any) -> Dict[str, int]:
+        usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+        if usage is None:
+            return {}
+        if not isinstance(usage, dict):
+            usage = usage.dict() if hasattr(usage, "dict") else {}
+        return usage
+
+    def _record(self, stats: _ModelStats, duration: float, failed: bool = False, usage: Optional[Dict[str, int]] = None):
+        with self._lock:
+            stats.calls += 1
+            stats.total_latency += duration
+            stats.max_latency = max(stats.max_latency, duration)
+            if failed:
+                stats.failures += 1
+            if usage:
+                stats.prompt_tokens += usage.get("prompt_tokens", 0) or 0
+                stats.completion_tokens += usage.get("completion_tokens", 0) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {model: stats.as_dict() for model, stats in self._stats.items()}
+
+
+llm_gateway = LLMGateway()
+
+
+class GatewayChatOpenAI(ChatOpenAI):
+    """ChatOpenAI yang mengirim semua request lewat LLMGateway"""
+
+    def completion_with_retry(self, run_manager: Any = None, **kwargs: Any) -> Any:
+        stream = bool(kwargs.get("stream"))
+        call = lambda: llm_gateway.call(self.model_name, lambda: self.client.create(**kwargs), stream=stream)
+        if llm_replay.enabled:
+            return llm_replay.chat(self.model_name, kwargs, call, stream=stream)
+        return call()
+
+
+class GatewayOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings yang mengirim semua request lewat LLMGateway"""
+
+    def _embed(self, texts, chunk_size: Optional[int] = 0):
+        return llm_gateway.call(self.model, lambda: super(GatewayOpenAIEmbeddings, self).embed_documents(texts, chunk_size))
+
+    def embed_documents(self, texts, chunk_size: Optional[int] = 0):
+        if llm_replay.enabled:
+            return llm_replay.embed(self.model, list(texts), lambda batch: self._embed(batch, chunk_size))
+        return self._embed(texts, chunk_size)
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+
+def get_chat_model(model: str, temperature: float = 0, stream_to_user: bool = False, **kwargs: Any) -> ChatOpenAI:
+    """
+    Buat chat model yang memakai gateway bersama.
+
+    Args:
+        model (str): Nama model OpenAI
+        temperature (float): Temperature model
+        stream_to_user (bool): Stream token ke placeholder Telegram jika TELEGRAM_STREAMING aktif
+    """
+    if stream_to_user:
+        kwargs.update(streaming_llm_kwargs())
+    if llm_replay.replaying:
+        # Fixtures answer every request, so no API key is needed offline
+        kwargs.setdefault("openai_api_key", os.getenv("OPENAI_API_KEY") or "replay")
+    return GatewayChatOpenAI(
+        model=model,
+        temperature=temperature,
+        request_timeout=llm_gateway.request_timeout,
+        # Retries are handled by the gateway
+        max_retries=0,
+        **kwargs
+    )
+
+
+def get_embeddings(**kwargs: Any) -> OpenAIEmbeddings:
+    """Buat embeddings client yang memakai gateway bersama"""
+    if llm_replay.replaying:
+        kwargs.setdefault("openai_api_key", os.getenv("OPENAI_API_KEY") or "replay")
+    return GatewayOpenAIEmbeddings(
+        request_timeout=llm_gateway.request_timeout,
+        # A single attempt per call; the gateway retries the whole batch
+        max_retries=1,
+        **kwargs
+    )
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from utils.logger import logger
+
+# Request fields that decide the response; credentials and transport settings are left out
+CHAT_KEY_FIELDS = (
+    "model", "messages", "functions", "function_call", "tools", "tool_choice",
+    "temperature", "top_p", "n", "stop", "max_tokens",
+)
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures", "llm")
+SYNTHETIC_EMBEDDING_DIM = 1536
+
+
+class ReplayMissError(RuntimeError):
+    """Tidak ada fixture untuk request ini saat LLM_REPLAY_MODE=replay"""
+
+
+def _to_jsonable(obj: Any) -> Any:
+    """Ubah response OpenAI (OpenAIObject atau model pydantic) menjadi dict biasa"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "to_dict_recursive"):
+        return obj.to_dict_recursive()
+    return json.loads(json.dumps(obj, default=str))
+
+
+def _hash(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+class LLMReplay:
+    """
+    Rekam dan putar ulang request OpenAI untuk benchmark tanpa jaringan.
+
+    - off: request langsung ke OpenAI (default)
+    - record: request tetap ke OpenAI, pasangan request/response disimpan
+      sebagai file JSON di LLM_REPLAY_DIR
+    - replay: response diambil dari fixture dengan latency sintetis; tidak
+      ada request ke OpenAI sama sekali
+
+    Fixture chat disimpan sebagai response lengkap (termasuk function call),
+    sehingga bisa diputar ulang sebagai response biasa maupun sebagai stream.
+    """
+
+    def __init__(self):
+        self.mode = os.getenv("LLM_REPLAY_MODE", "off").lower()
+        self.fixture_dir = os.getenv("LLM_REPLAY_DIR", DEFAULT_FIXTURE_DIR)
+        # Milliseconds per call, or "recorded" to reuse the latency captured while recording
+        self.latency = os.getenv("LLM_REPLAY_LATENCY_MS", "0")
+        self.jitter_ms = float(os.getenv("LLM_REPLAY_JITTER_MS", 0))
+        # What to do without a fixture: "error" or "synthetic"
+        self.on_miss = os.getenv("LLM_REPLAY_ON_MISS", "error").lower()
+
+        self._random = random.Random(int(os.getenv("LLM_REPLAY_SEED", 0)))
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._stats = {"recorded": 0, "replayed": 0, "synthetic": 0, "missed": 0, "simulated_latency_ms": 0.0}
+
+        if self.mode not in ("off", "record", "replay"):
+            logger.warning(f"Unknown LLM_REPLAY_MODE={self.mode}, falling back to off")
+            self.mode = "off"
+        if self.mode != "off":
+            logger.info(f"LLM replay mode: {self.mode} (fixtures in {self.fixture_dir})")
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # ------------------------------------------------------------------
+    # Fixture files
+
+    def _path(self, kind: str, model: str, key: str) -> str:
+        return os.path.join(self.fixture_dir, kind, _safe_name(model), f"{key}.json")
+
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if path in self._cache:
+                return self._cache[path]
+        fixture = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+        with self._lock:
+            self._cache[path] = fixture
+        return fixture
+
+    def _save(self, path: str, fixture: Dict[str, Any]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._cache[path] = fixture
+            self._stats["recorded"] += 1
+
+    def _count(self, name: str, amount: float = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _sleep(self, recorded_ms: Optional[float]):
+        if self.latency == "recorded":
+            delay_ms = recorded_ms or 0.0
+        else:
+            delay_ms = float(self.latency or 0)
+        if self.jitter_ms:
+            with self._lock:
+                delay_ms += self._random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            self._count("simulated_latency_ms", delay_ms)
+            time.sleep(delay_ms / 1000)
+
+    # ------------------------------------------------------------------
+    # Chat completions
+
+    def chat(self, model: str, request: Dict[str, Any], call: Callable[[], Any], stream: bool = False) -> Any:
+        """
+        Jalankan chat completion sesuai mode replay.
+
+        Args:
+            model (str): Nama model
+            request (dict): kwargs yang dikirim ke ChatCompletion.create
+            call (Callable): Request asli ke OpenAI (lewat gateway)
+            stream (bool): Apakah caller mengharapkan iterator chunk
+        """
+        key_fields = {name: request[name] for name in CHAT_KEY_FIELDS if name in request}
+        key_fields.setdefault("model", model)
+        path = self._path("chat", model, _hash(key_fields))
+
+        if self.mode == "record":
+            started = time.perf_counter()
+            response = call()
+            if stream:
+                return self._record_stream(path, key_fields, response, started)
+            response = _to_jsonable(response)
+            self._save(path, {
+                "request": key_fields,
+                "response": response,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            })
+            return response
+
+        fixture = self._load(path)
+        if fixture is None:
+            self._count("missed")
+            if self.on_miss != "synthetic":
+                raise ReplayMissError(f"No LLM fixture for {model} at {path}")
+            self._count("synthetic")
+            response = self._synthetic_chat(model, key_fields)
+            recorded_ms = None
+        else:
+            self._count("replayed")
+            response = fixture["response"]
+            recorded_ms = fixture.get("latency_ms")
+
+        if stream:
+            return self._replay_stream(response, recorded_ms)
+        self._sleep(recorded_ms)
+        return response
+
+    def _record_stream(self, path: str, key_fields: Dict[str, Any], chunks: Iterator[Any], started: float) -> Iterator[Any]:
+        """Teruskan chunk ke caller sambil menyusun response lengkap untuk fixture"""
+        content: List[str] = []
+        function_call = {"name": "", "arguments": ""}
+        role = "assistant"
+        finish_reason = None
+        first_chunk_ms = None
+
+        for chunk in chunks:
+            if first_chunk_ms is None:
+                first_chunk_ms = round((time.perf_counter() - started) * 1000, 2)
+            data = _to_jsonable(chunk)
+            for choice in data.get("choices", [])[:1]:
+                delta = choice.get("delta") or {}
+                role = delta.get("role") or role
+                content.append(delta.get("content") or "")
+                if delta.get("function_call"):
+                    function_call["name"] += delta["function_call"].get("name") or ""
+                    function_call["arguments"] += delta["function_call"].get("arguments") or ""
+                finish_reason = choice.get("finish_reason") or finish_reason
+            yield chunk
+
+        message: Dict[str, Any] = {"role": role, "content": "".join(content) or None}
+        if function_call["name"]:
+            message["function_call"] = function_call
+        self._save(path, {
+            "request": key_fields,
+            "response": {
+                "object": "chat.completion",
+                "model": key_fields.get("model"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": {},
+            },
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "first_chunk_ms": first_chunk_ms,
+        })
+
+    def _replay_stream(self, response: Dict[str, Any], recorded_ms: Optional[float]) -> Iterator[Dict[str, Any]]:
+        """Pecah response lengkap menjadi chunk stream seperti yang dikirim OpenAI"""
+        message = response["choices"][0]["message"]
+        chunks = [{"role": message.get("role", "assistant"), "content": ""}]
+        for piece in re.findall(r"\S+\s*|\s+", message.get("content") or ""):
+            chunks.append({"content": piece})
+        if message.get("function_call"):
+            chunks.append({"function_call": message["function_call"]})
+
+        # Spread the simulated latency over the chunks so streaming consumers see progress
+        self._sleep(recorded_ms)
+        for delta in chunks:
+            yield {"choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {"choices": [{"index": 0, "delta": {}, "finish_reason": response["choices"][0].get("finish_reason") or "stop"}]}
+
+    @staticmethod
+    def _synthetic_chat(model: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Response pengganti yang deterministik untuk benchmark tanpa fixture.
+
+        Agent ReAct (format JSON "action"/"action_input") mendapat Final Answer
+        dalam format yang bisa diparse; agent lain mendapat teks biasa.
+        """
+        messages = request.get("messages") or []
+        question = next(
+            (m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        question = " ".join(question.split())[:200]
+        answer = f"Jawaban sintetis untuk: {question}" if question else "Jawaban sintetis."
+
+        prompt = " ".join(str(m.get("content") or "") for m in messages)
+        if '"action_input"' in prompt:
+            answer = "```json\n" + json.dumps({"action": "Final Answer", "action_input": answer}, ensure_ascii=False) + "\n```"
+
+        return {
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    # ------------------------------------------------------------------
+    # Embeddings
+
+    def embed(self, model: str, texts: List[str], call: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Embeddings per teks; teks yang belum punya fixture direkam (record) atau disintesis (replay)"""
+        paths = [self._path("embeddings", model, _hash({"model": model, "input": text})) for text in texts]
+
+        if self.mode == "record":
+            started = time.perf_counter()
+            vectors = call(texts)
+            latency_ms = round((time.perf_counter() - started) * 1000 / max(len(texts), 1), 2)
+            for path, text, vector in zip(paths, texts, vectors):
+                self._save(path, {"request": {"model": model, "input": text}, "response": vector, "latency_ms": latency_ms})
+            return vectors
+
+        vectors = []
+        recorded_ms = 0.0
+        for path, text in zip(paths, texts):
+            fixture = self._load(path)
+            if fixture is None:
+                self._count("missed")
+                if self.on_miss != "synthetic":
+                    raise ReplayMissError(f"No embedding fixture for {model} at {path}")
+                self._count("synthetic")
+                vectors.append(self._synthetic_embedding(text))
+            else:
+                self._count("replayed")
+                vectors.append(fixture["response"])
+                recorded_ms += fixture.get("latency_ms") or 0.0
+        # One simulated round trip per batch, like the real API
+        self._sleep(recorded_ms)
+        return vectors
+
+    @staticmethod
+    def _synthetic_embedding(text: str) -> List[float]:
+        """Vektor unit deterministik dari hash teks"""
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        vector = [rng.gauss(0, 1) for _ in range(SYNTHETIC_EMBEDDING_DIM)]
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["simulated_latency_ms"] = round(stats["simulated_latency_ms"], 2)
+        stats["mode"] = self.mode
+        return stats
+
+
+llm_replay = LLMReplay()
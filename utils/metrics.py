@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+from utils.tracing import tracer, tracing_callback
+
+# Stage names used across the request path
+CHAT_INSERT = "chat_insert"
+ROUTING = "routing"
+LLM_ROUTER = "llm_router"
+SUB_AGENT = "sub_agent"
+TOOL = "tool"
+LLM = "llm"
+FORMATTER = "formatter"
+REPLY = "reply"
+REQUEST = "request"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Persentil dengan interpolasi linear; sorted_values harus sudah terurut"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Ringkasan latency (ms) dari daftar durasi dalam detik"""
+    values = sorted(durations)
+    return {
+        "count": len(values),
+        "avg_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+class StageMetrics:
+    """
+    Latency per tahap request (chat insert, routing, sub-agent, tool,
+    formatter, reply). Setiap tahap menyimpan METRICS_MAX_SAMPLES durasi
+    terakhir sehingga memori tetap terbatas.
+    """
+
+    def __init__(self, max_samples: Optional[int] = None):
+        self.max_samples = max_samples or int(os.getenv("METRICS_MAX_SAMPLES", 5000))
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def record(self, name: str, duration: float):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.max_samples)
+                self._counts[name] = 0
+            self._samples[name].append(duration)
+            self._counts[name] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            # Every stage is also a span when the request is traced
+            with tracer.span(name):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+        result = {}
+        for name, values in samples.items():
+            result[name] = summarize(values)
+            result[name]["count"] = counts[name]
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+stage_metrics = StageMetrics()
+
+
+def stage(name: str):
+    """Context manager untuk mengukur satu tahap: `with stage(ROUTING): ...`"""
+    return stage_metrics.stage(name)
+
+
+class StageCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain yang mencatat durasi setiap tool call dan LLM call"""
+
+    def __init__(self, metrics: StageMetrics = stage_metrics):
+        self.metrics = metrics
+        self._started: Dict[UUID, float] = {}
+
+    def _start(self, run_id: UUID):
+        self._started[run_id] = time.perf_counter()
+
+    def _end(self, name: str, run_id: UUID):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.metrics.record(name, time.perf_counter() - started)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(TOOL, run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(TOOL, run_id)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(LLM, run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(LLM, run_id)
+
+
+stage_callback = StageCallbackHandler()
+
+
+def agent_callbacks() -> List[BaseCallbackHandler]:
+    """Callback yang dipasang pada setiap pemanggilan AgentExecutor sub-agent"""
+    return [stage_callback, tracing_callback]
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+
+# Telegram ID milik request yang sedang diproses, dibawa ke worker thread
+current_session_id: ContextVar[Optional[str]] = ContextVar(
+    "current_session_id", default=None)
+
+DEFAULT_SESSION_ID = "anonymous"
+
+
+def get_current_session_id() -> str:
+    """Session ID untuk request aktif, atau DEFAULT_SESSION_ID jika di luar request"""
+    return current_session_id.get() or DEFAULT_SESSION_ID
+
+
+class _Session:
+    def __init__(self):
+        self.histories: Dict[str, List[Any]] = {}
+        self.token_counts: Dict[str, List[int]] = {}
+        # Messages trimmed from the window that are not yet in the summary
+        self.overflow: Dict[str, List[Any]] = {}
+        self.summaries: Dict[str, str] = {}
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Penyimpanan riwayat percakapan per pengguna (telegram_id).
+
+    Setiap session menyimpan riwayat terpisah per namespace agent
+    ("main", "db", "qa", ...) dengan batas jumlah pesan (dan opsional batas
+    token), eviction LRU berdasarkan jumlah session maksimum, dan TTL saat
+    idle. Pesan yang terpotong dari window disimpan sebagai overflow sampai
+    digabung ke ringkasan (lihat utils/history.py).
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_messages: Optional[int] = None
+    ):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", 3600))
+        self.max_messages = max_messages or int(os.getenv("SESSION_MAX_MESSAGES", 20))
+
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lru_evictions = 0
+        self._ttl_evictions = 0
+
+    def _get_session(self, session_id: str) -> _Session:
+        """Ambil (atau buat) session dan tandai sebagai yang terakhir dipakai. Harus dipanggil dengan lock."""
+        self._evict_expired()
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session()
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._lru_evictions += 1
+                logger.info(f"Session {evicted_id} evicted (LRU)")
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_access = time.monotonic()
+        return session
+
+    def _evict_expired(self):
+        """Hapus session yang idle melebihi TTL. Harus dipanggil dengan lock."""
+        now = time.monotonic()
+        # OrderedDict terurut dari yang paling lama tidak dipakai
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._ttl_evictions += 1
+
+    def get_history(self, session_id: str, namespace: str) -> List[Any]:
+        """Salinan riwayat pesan untuk session dan namespace tertentu"""
+        with self._lock:
+            session = self._get_session(str(session_id))
+            return list(session.histories.get(namespace, []))
+
+    def append(
+        self,
+        session_id: str,
+        namespace: str,
+        *messages: Any,
+        token_counter: Optional[Callable[[Any], int]] = None,
+        max_tokens: Optional[int] = None
+    ):
+        """
+        Tambahkan pesan ke riwayat, lalu potong pesan terlama sampai jumlah
+        pesan <= max_messages dan (jika diberikan) total token <= max_tokens.
+        Pesan terbaru selalu dipertahankan.
+        """
+        with self._lock:
+            session = self._get_session(str(session_id))
+            history = session.histories.setdefault(namespace, [])
+            counts = session.token_counts.setdefault(namespace, [])
+            for message in messages:
+                history.append(message)
+                counts.append(token_counter(message) if token_counter else 0)
+
+            overflow = session.overflow.setdefault(namespace, [])
+            while len(history) > 1 and (
+                len(history) > self.max_messages
+                or (max_tokens is not None and sum(counts) > max_tokens)
+            ):
+                overflow.append(history.pop(0))
+                counts.pop(0)
+
+    def get_summary_state(self, session_id: str, namespace: str) -> Tuple[Optional[str], List[Any]]:
+        """Ringkasan saat ini dan pesan overflow yang belum diringkas"""
+        with self._lock:
+            session = self._get_session(str(session_id))
+            return (
+                session.summaries.get(namespace),
+                list(session.overflow.get(namespace, []))
+            )
+
+    def set_summary(self, session_id: str, namespace: str, summary: str, consumed: List[Any]) -> bool:
+        """
+        Simpan ringkasan baru yang mencakup pesan overflow `consumed` (dari
+        get_summary_state). Ditolak (False) jika overflow tidak lagi diawali
+        pesan-pesan tersebut: request lain sudah menyimpan ringkasannya lebih
+        dulu, atau riwayat dihapus sementara ringkasan dibuat.
+        """
+        with self._lock:
+            session = self._get_session(str(session_id))
+            overflow = session.overflow.get(namespace, [])
+            if len(overflow) < len(consumed) or any(
+                    current is not message for current, message in zip(overflow, consumed)):
+                return False
+            session.summaries[namespace] = summary
+            del overflow[:len(consumed)]
+            return True
+
+    def clear(self, session_id: Optional[str] = None, namespace: Optional[str] = None):
+        """Hapus riwayat satu session/namespace, atau semua session jika session_id kosong"""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                return
+
+            session = self._sessions.get(str(session_id))
+            if session is None:
+                return
+            if namespace is None:
+                del self._sessions[str(session_id)]
+            else:
+                session.histories.pop(namespace, None)
+                session.token_counts.pop(namespace, None)
+                session.overflow.pop(namespace, None)
+                session.summaries.pop(namespace, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jumlah session, pesan, perkiraan memori, dan eviction"""
+        with self._lock:
+            self._evict_expired()
+            total_messages = 0
+            total_bytes = 0
+            total_tokens = 0
+            total_summaries = 0
+            for session in self._sessions.values():
+                for history in session.histories.values():
+                    total_messages += len(history)
+                    for message in history:
+                        content = getattr(message, "content", message)
+                        total_bytes += len(str(content).encode("utf-8"))
+                for counts in session.token_counts.values():
+                    total_tokens += sum(counts)
+                for summary in session.summaries.values():
+                    total_summaries += 1
+                    total_bytes += len(summary.encode("utf-8"))
+
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "max_messages_per_history": self.max_messages,
+                "messages": total_messages,
+                "approx_bytes": total_bytes,
+                "history_tokens": total_tokens,
+                "summaries": total_summaries,
+                "lru_evictions": self._lru_evictions,
+                "ttl_evictions": self._ttl_evictions,
+            }
+
+
+session_store = SessionStore()
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+from utils.logger import logger
+
+T = TypeVar("T")
+
+
+class StartupReport:
+    """Catatan durasi inisialisasi setiap komponen sejak proses dimulai"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._timings: Dict[str, float] = {}
+        self._first_ready: Optional[float] = None
+
+    def record(self, name: str, duration: float):
+        with self._lock:
+            self._timings[name] = duration
+        logger.info(f"Startup: {name} ready in {duration * 1000:.0f} ms")
+
+    @contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark_ready(self):
+        """Tandai saat aplikasi siap menerima pesan pertama"""
+        with self._lock:
+            if self._first_ready is None:
+                self._first_ready = time.perf_counter() - self.started_at
+        logger.info(f"Startup: ready to serve after {self._first_ready * 1000:.0f} ms")
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready_after_ms": round(self._first_ready * 1000, 2) if self._first_ready is not None else None,
+                "components_ms": {name: round(duration * 1000, 2) for name, duration in self._timings.items()},
+            }
+
+
+startup_report = StartupReport()
+
+
+class Lazy(Generic[T]):
+    """
+    Objek yang baru dibangun saat pertama kali dipakai.
+
+    Aman dipanggil dari banyak thread: factory hanya dijalankan sekali dan
+    durasinya dicatat di startup_report.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with startup_report.measure(self.name):
+                        self._instance = self._factory()
+        return self._instance
+
+
+def warm_up(components: Iterable[Lazy], parallel: bool = True) -> Dict[str, Any]:
+    """Bangun komponen lazy lebih awal, paralel jika diminta"""
+    components = list(components)
+    started = time.perf_counter()
+
+    def build(component: Lazy):
+        try:
+            component.get()
+        except Exception as e:
+            logger.error(f"Warm-up of {component.name} failed: {e}")
+
+    if parallel and len(components) > 1:
+        with ThreadPoolExecutor(max_workers=len(components), thread_name_prefix="warm-up") as executor:
+            list(executor.map(build, components))
+    else:
+        for component in components:
+            build(component)
+
+    startup_report.record("warm_up", time.perf_counter() - started)
+    return startup_report.report()
@@ -0,0 +1,76 @@
+import os
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+class StreamBuffer:
+    """Thread-safe buffer berisi token dari langkah LLM yang sedang berjalan"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: List[str] = []
+
+    def reset(self):
+        with self._lock:
+            self._tokens = []
+
+    def append(self, token: str):
+        with self._lock:
+            self._tokens.append(token)
+
+    def text(self) -> str:
+        with self._lock:
+            return "".join(self._tokens)
+
+    def visible_text(self) -> str:
+        """
+        Text yang layak ditampilkan ke user.
+
+        Output ReAct agent utama berupa blob JSON action, bukan jawaban,
+        sehingga tidak ditampilkan.
+        """
+        text = self.text().strip()
+        if text.startswith(("{", "`")):
+            return ""
+        return text
+
+
+# Buffer milik request aktif; None berarti request tidak di-stream
+current_stream: ContextVar[Optional[StreamBuffer]] = ContextVar(
+    "current_stream", default=None)
+
+
+class StreamToBufferHandler(BaseCallbackHandler):
+    """Callback LangChain yang meneruskan token LLM ke buffer request aktif"""
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any):
+        buffer = current_stream.get()
+        if buffer:
+            buffer.reset()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any):
+        buffer = current_stream.get()
+        if buffer:
+            buffer.reset()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        buffer = current_stream.get()
+        if buffer and token:
+            buffer.append(token)
+
+
+stream_handler = StreamToBufferHandler()
+
+
+def streaming_enabled() -> bool:
+    return os.getenv("TELEGRAM_STREAMING", "false").lower() == "true"
+
+
+def streaming_llm_kwargs() -> Dict[str, Any]:
+    """Argumen tambahan ChatOpenAI untuk LLM yang menghasilkan jawaban akhir"""
+    if not streaming_enabled():
+        return {}
+    return {"streaming": True, "callbacks": [stream_handler]}
@@ -0,0 +1,311 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import requests
+from langchain.callbacks.base import BaseCallbackHandler
+
+from utils.logger import logger
+
+MAX_ATTRIBUTE_LENGTH = 300
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = {key: _attribute(value) for key, value in attributes.items()}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        for key, value in attributes.items():
+            self.attributes[key] = _attribute(value)
+
+    def end(self, error: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:MAX_ATTRIBUTE_LENGTH]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def _attribute(value: Any) -> Any:
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    return str(value)[:MAX_ATTRIBUTE_LENGTH]
+
+
+class Trace:
+    """Semua span dari satu request; span dari worker thread ditambahkan dengan lock"""
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.request_id = request_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+
+# Trace of the request being handled, and the innermost open span
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+
+class SpanExporter:
+    """
+    Kirim span di background thread agar request tidak ikut menunggu I/O.
+
+    TRACE_EXPORTER:
+    - "jsonl": satu span per baris di TRACE_FILE (default)
+    - "otlp" : OTLP/HTTP JSON ke TRACE_OTLP_ENDPOINT
+    - "none" : span dibuang (hanya berguna untuk mengukur overhead)
+    """
+
+    def __init__(self):
+        self.kind = os.getenv("TRACE_EXPORTER", "jsonl").lower()
+        self.path = os.getenv("TRACE_FILE", "traces.jsonl")
+        self.endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.service_name = os.getenv("TRACE_SERVICE_NAME", "pak-kos")
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=int(os.getenv("TRACE_QUEUE_SIZE", 1000)))
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, spans: List[Span]):
+        if self.kind == "none" or not spans:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _worker(self):
+        while True:
+            batch = self._queue.get()
+            # Drain whatever else is waiting so slow exports are batched
+            while not self._queue.empty() and len(batch) < 512:
+                batch = batch + self._queue.get_nowait()
+            try:
+                if self.kind == "otlp":
+                    self._export_otlp(batch)
+                else:
+                    self._export_jsonl(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def _export_jsonl(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.as_dict(), ensure_ascii=False) + "\n")
+
+    def _export_otlp(self, spans: List[Span]):
+        def attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+            result = []
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    result.append({"key": key, "value": {"boolValue": value}})
+                elif isinstance(value, int):
+                    result.append({"key": key, "value": {"intValue": str(value)}})
+                elif isinstance(value, float):
+                    result.append({"key": key, "value": {"doubleValue": value}})
+                elif value is not None:
+                    result.append({"key": key, "value": {"stringValue": value}})
+            return result
+
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": attributes({"service.name": self.service_name})},
+            "scopeSpans": [{
+                "scope": {"name": "pak-kos.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                    "attributes": attributes(span.attributes),
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                } for span in spans],
+            }],
+        }]}
+        response = requests.post(self.endpoint, json=payload, timeout=5)
+        response.raise_for_status()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"exporter": self.kind, "exported": self.exported, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+class Tracer:
+    """
+    Tracing ringan per request.
+
+    Hanya request yang tersampel (TRACE_SAMPLE_RATE, 0.0 - 1.0) yang
+    mencatat span; di request lain `span()` hanya membaca satu context
+    variable sehingga overhead-nya bisa diabaikan.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        self.sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+        self.exporter = exporter or SpanExporter()
+        self._traces = 0
+        self._sampled = 0
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes: Any):
+        """Root span untuk satu request; request id dibawa lewat context variable"""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        trace = Trace(uuid.uuid4().hex, sampled)
+        self._traces += 1
+        if sampled:
+            self._sampled += 1
+
+        trace_token = current_trace.set(trace)
+        try:
+            if not sampled:
+                yield trace
+                return
+            with self.span(name, **attributes):
+                yield trace
+        finally:
+            current_trace.reset(trace_token)
+            if sampled:
+                self.exporter.export(trace.spans)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        trace = current_trace.get()
+        if trace is None or not trace.sampled:
+            yield None
+            return
+
+        parent = current_span.get()
+        span = Span(trace.request_id, parent.span_id if parent else None, name, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            current_span.reset(token)
+            if span.end_ns is None:
+                span.end()
+            trace.add(span)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "traces": self._traces,
+            "sampled": self._sampled,
+            **self.exporter.stats(),
+        }
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes: Any):
+    """Context manager untuk satu span di dalam request aktif: `with span("db.fetch_all"): ...`"""
+    return tracer.span(name, **attributes)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Span untuk setiap tool call, LLM call dan retrieval di dalam LangChain"""
+
+    def __init__(self):
+        self._spans: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, name: str, **attributes: Any):
+        trace = current_trace.get()
+        if trace is None or not trace.sampled:
+            return
+        parent = current_span.get()
+        self._spans[run_id] = (trace, Span(trace.request_id, parent.span_id if parent else None, name, attributes))
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any):
+        entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return
+        trace, span = entry
+        span.set(**attributes)
+        span.end(error=error)
+        trace.add(span)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"tool.{serialized.get('name', 'unknown')}", input=input_str)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, output_chars=len(str(output)))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (kwargs.get("invocation_params") or {}).get("model")
+        self._start(run_id, "llm", model=model)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        self._end(run_id, **{f"tokens.{key}": value for key, value in usage.items()})
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=error)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, "retriever", query=query)
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=error)
+
+
+tracing_callback = TracingCallbackHandler()
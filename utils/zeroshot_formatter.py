@@ -1,18 +1,65 @@
+import hashlib
+import os
 import re
+import threading
+from collections import OrderedDict
 from langchain.prompts import PromptTemplate
 
+from utils.deadline import expired, record_hit
+from utils.metrics import FORMATTER
+
+# "N." followed by text; never part of a price (1.500.000), time (23.00) or date (17.08.2025)
+ENUMERATION_MARKER = re.compile(r'(?<![\d.,])(\d{1,2})\.(?=\s*[^\d\s])')
+
+
+def enumeration_markers(text: str) -> list:
+    """
+    Marker list bernomor yang sungguhan: deret 1., 2., 3., ... minimal dua
+    item, dimulai di awal baris atau setelah ':' / akhir kalimat. "Kamar
+    nomor 3. Sudah terisi." tidak dianggap list.
+    """
+    markers, run = [], []
+    for match in ENUMERATION_MARKER.finditer(text):
+        number = int(match.group(1))
+        before = text[:match.start()].rstrip(' \t')
+        if number == 1 and (not before or before[-1] in '\n:.!?;'):
+            if len(run) >= 2:
+                markers.extend(run)
+            run = [match]
+        elif run and number == int(run[-1].group(1)) + 1:
+            run.append(match)
+    if len(run) >= 2:
+        markers.extend(run)
+    return markers
+
 
 class ZeroShotTextFormatter:
     """
     Zero-shot formatter untuk merapihkan output text tanpa mengubah konten.
     Fokus pada formatting visual: spacing, line breaks, bullet points, dll.
+
+    LLM hanya dipanggil jika skor struktur hasil rule-based masih di bawah
+    threshold, dan hasil format di-cache berdasarkan hash input.
     """
 
     def __init__(self, use_llm: bool = True, model_name: str = "gpt-4.1-mini"):
         self.use_llm = use_llm
+        self.skip_threshold = float(os.getenv("FORMATTER_SKIP_THRESHOLD", 0.7))
+        self.cache_size = int(os.getenv("FORMATTER_CACHE_SIZE", 256))
+        # Seconds of request budget an LLM formatting call needs
+        self.deadline_reserve = float(os.getenv("FORMATTER_DEADLINE_RESERVE_SECONDS", 3))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "llm_calls": 0,
+            "llm_skipped": 0,
+            "deadline_skipped": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
         if use_llm:
-            from langchain.chat_models import ChatOpenAI
-            self.llm = ChatOpenAI(model=model_name, temperature=0)
+            from utils.llm_gateway import get_chat_model
+            self.llm = get_chat_model(model_name, temperature=0)
             self._setup_formatter_prompt()
 
     def _setup_formatter_prompt(self):
@@ -77,17 +124,86 @@ Text yang sudah dirapihkan (konten sama, format lebih baik):"""
         if not text or not text.strip():
             return text
 
-        # Coba LLM formatter dulu jika tersedia
-        if self.use_llm:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        rule_based = self._rule_based_format(text)
+        formatted = rule_based
+
+        # LLM hanya jika hasil rule-based belum cukup rapi
+        if self.use_llm and self._structure_score(rule_based) < self.skip_threshold:
+            if expired(self.deadline_reserve):
+                # Out of time: send the rule-based result, but do not cache it
+                record_hit(FORMATTER)
+                self._count("deadline_skipped")
+                return formatted
+            self._count("llm_calls")
             try:
-                formatted = self._llm_format(text)
-                if formatted and self._is_valid_format(formatted, text):
-                    return formatted
+                llm_formatted = self._llm_format(text)
+                if llm_formatted and self._is_valid_format(llm_formatted, text):
+                    formatted = llm_formatted
             except Exception:
                 pass  # Fallback ke rule-based
+        elif self.use_llm:
+            self._count("llm_skipped")
+
+        self._cache_put(key, formatted)
+        return formatted
 
-        # Fallback ke rule-based formatting
-        return self._rule_based_format(text)
+    def _structure_score(self, text: str) -> float:
+        """
+        Skor 0..1 seberapa rapi struktur text.
+        1.0 berarti sudah layak kirim tanpa LLM.
+        """
+        if len(text) <= 300 and text.count('\n') <= 5:
+            return 1.0
+
+        score = 1.0
+        lines = [line for line in text.split('\n') if line.strip()]
+
+        # Paragraf panjang tanpa line break sulit dibaca di Telegram
+        long_lines = [line for line in lines if len(line) > 400]
+        score -= 0.25 * len(long_lines)
+
+        # Enumerasi yang masih menempel di tengah kalimat: "... 2. xxx 3. yyy"
+        glued = [m for m in enumeration_markers(text) if not text[:m.start()].endswith('\n')]
+        score -= 0.15 * len(glued)
+
+        # Deretan data dipisah koma yang belum dijadikan list
+        score -= 0.1 * len(re.findall(r'(?:[^,\n]{3,40},){4,}', text))
+
+        # Spasi ganda atau line break berlebihan tersisa
+        if re.search(r'[^\S\n]{2,}|\n{3,}', text):
+            score -= 0.1
+
+        return max(score, 0.0)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _cache_get(self, key: str):
+        with self._lock:
+            formatted = self._cache.get(key)
+            if formatted is None:
+                self._stats["cache_misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["cache_hits"] += 1
+            return formatted
+
+    def _cache_put(self, key: str, formatted: str):
+        with self._lock:
+            self._cache[key] = formatted
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Counter pemanggilan LLM, skip, dan cache hit"""
+        with self._lock:
+            return {**self._stats, "cache_entries": len(self._cache)}
 
     def _llm_format(self, text: str) -> str:
         """Format menggunakan LLM dengan zero-shot prompt"""
@@ -144,11 +260,13 @@ Text yang sudah dirapihkan (konten sama, format lebih baik):"""
         """Format berbagai jenis list menjadi rapi"""
 
         # Format numbered lists (1.something 2.something)
-        text = re.sub(r'(\d+)\.([^\d])', r'\1. \2', text)
-        text = re.sub(r'(\d+\.[^.]*?)(\d+\.)', r'\1\n\2', text)
-
-        # Format comma-separated numbered items
-        text = re.sub(r'(\d+\.[^,]*),\s*(\d+\.)', r'\1\n\2', text)
+        text = re.sub(r'(\d+)\.(?=[^\d\s])', r'\1. ', text)
+        # Every item of a real enumeration on its own line, also when
+        # separated by commas ("1. a, 2. b"); lone "kamar 3." stays in its sentence
+        for marker in reversed(enumeration_markers(text)):
+            head = text[:marker.start()].rstrip(' \t')
+            if head and not head.endswith('\n'):
+                text = head.rstrip(',') + '\n' + text[marker.start():]
 
         # Format items yang dipisah dengan koma tapi bisa jadi list
         # Pattern: "item1, item2, item3" -> list format
@@ -219,6 +337,7 @@ Text yang sudah dirapihkan (konten sama, format lebih baik):"""
         text = re.sub(r'\n{3,}', '\n\n', text)
 
         # Ensure proper spacing around bullets
+        text = re.sub(r'•(\s*•)+', '•', text)
         text = re.sub(r'\n•', '\n• ', text)
         text = re.sub(r'\n• +', '\n• ', text)
 